@@ -0,0 +1,103 @@
+'''
+Benchmark splitting ProcessingSet datasets by time gap for concat_ps_xdt.
+
+Compares the previous list-based implementation (sorted_times.index() per gap, O(n^2))
+with the numpy implementation (searchsorted, O(n log n)) for interleaved datasets,
+and checks that both return the same split datasets and first times.
+
+    python devel/benchmarks/concat_time_split.py
+'''
+
+import time
+
+import numpy as np
+import xarray as xr
+
+from vidavis.data.measurement_set.processing_set._ps_concat import _get_sorted_times, _split_xds_by_time_gap
+
+def list_sorted_times(ps):
+    ''' Previous _get_sorted_times '''
+    values = []
+    for key in ps:
+        time_values = ps[key].time.values
+        if time_values.size > 1:
+            values.extend(time_values.tolist())
+        else:
+            values.append(time_values)
+    return sorted(values)
+
+def list_split_xds_by_time_gap(xds, sorted_times):
+    ''' Previous _split_xds_by_time_gap '''
+    times = xds.time.values.ravel()
+    xds_list = []
+    first_times = [times[0]]
+
+    if len(times) == 1:
+        xds_list.append(xds)
+    else:
+        sorted_time_idx = sorted_times.index(times[0])
+        idx = xds_start_idx = 0
+
+        for idx, time_value in enumerate(times):
+            if time_value == sorted_times[sorted_time_idx]:
+                sorted_time_idx += 1
+                continue
+            xds_list.append(xds.isel(time=slice(xds_start_idx, idx)))
+            xds_start_idx = idx
+            first_times.append(times[idx])
+            sorted_time_idx = sorted_times.index(time_value) + 1
+        xds_list.append(xds.isel(time=slice(xds_start_idx, idx + 1)))
+
+    return xds_list, first_times
+
+def make_ps(num_times, num_xds, scan_length, rng):
+    ''' Return dict of xds with num_times total times, in scans of scan_length times assigned randomly to num_xds '''
+    times = 4.8e9 + np.arange(num_times) * 10.0
+    scan_xds = rng.integers(num_xds, size=(num_times + scan_length - 1) // scan_length)
+    time_xds = np.repeat(scan_xds, scan_length)[:num_times]
+    ps = {}
+    for idx in range(num_xds):
+        xds_times = times[time_xds == idx]
+        ps[f"xds_{idx}"] = xr.Dataset({'VISIBILITY': ('time', np.zeros(xds_times.size))}, coords={'time': xds_times})
+    return ps
+
+def split_ps(ps, sorted_times_function, split_function):
+    ''' Split all xds in ps, return elapsed time, time slices, and first times '''
+    start = time.perf_counter()
+    sorted_times = sorted_times_function(ps)
+    slices = []
+    first_times = []
+    for xds in ps.values():
+        xds_list, times = split_function(xds, sorted_times)
+        slices.extend((xds.time.values[0], xds_split.time.size) for xds_split in xds_list)
+        first_times.extend(times)
+    return time.perf_counter() - start, slices, [float(first_time) for first_time in first_times]
+
+def check_duplicate_times(rng):
+    ''' Check same output when datasets share times (e.g. spectral windows) '''
+    ps = make_ps(200, 3, 7, rng)
+    ps['xds_copy'] = ps['xds_0'].copy()
+    _, list_slices, list_times = split_ps(ps, list_sorted_times, list_split_xds_by_time_gap)
+    _, np_slices, np_times = split_ps(ps, _get_sorted_times, _split_xds_by_time_gap)
+    assert list_slices == np_slices and list_times == np_times, "duplicate times: outputs differ"
+
+def main():
+    ''' Print timing for increasing number of times '''
+    rng = np.random.default_rng(0)
+    check_duplicate_times(rng)
+
+    print(f"{'times':>9} {'list (s)':>10} {'numpy (s)':>10} {'numpy / n log n (ns)':>21}")
+    for num_times in [1000, 4000, 16000, 64000, 256000]:
+        ps = make_ps(num_times, 4, 50, rng)
+        np_time, np_slices, np_times = split_ps(ps, _get_sorted_times, _split_xds_by_time_gap)
+
+        list_time = np.nan
+        if num_times <= 16000: # O(n^2)
+            list_time, list_slices, list_times = split_ps(ps, list_sorted_times, list_split_xds_by_time_gap)
+            assert list_slices == np_slices and list_times == np_times, f"{num_times} times: outputs differ"
+
+        scaled = np_time / (num_times * np.log2(num_times)) * 1e9
+        print(f"{num_times:>9} {list_time:>10.3f} {np_time:>10.3f} {scaled:>21.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Benchmark iteration plot prefetch for a 64-panel (8x8) raster iteration plot.
+
+Compares prefetch depth 1 and 2 with the default ITER_PREFETCH_DEPTH (sized from cpu count),
+computing each raster plane with the synchronous or threaded dask scheduler.
+Each case runs in a new process so raster and selection caches do not carry over.
+
+    python devel/benchmarks/iter_prefetch.py <processing set zarr path> [iter_axis]
+
+The processing set must have at least 64 iter_axis values (default time).
+'''
+
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+def run_case(ps_path, iter_axis, depth, scheduler):
+    ''' Time 64-panel iteration plot with prefetch depth and dask scheduler, in this process '''
+    # pylint: disable=import-outside-toplevel
+    import dask
+    import vidavis.apps._ms_raster
+    from vidavis.apps import MsRaster
+    # pylint: enable=import-outside-toplevel
+
+    warnings.simplefilter('ignore')
+    vidavis.apps._ms_raster.ITER_PREFETCH_DEPTH = depth # pylint: disable=protected-access
+    y_axis = 'frequency' if iter_axis == 'time' else 'time'
+    msr = MsRaster(ps_path, log_level='warning', log_to_file=False)
+    with dask.config.set(scheduler=scheduler):
+        start = time.perf_counter()
+        msr.plot(x_axis='baseline', y_axis=y_axis, iter_axis=iter_axis, iter_range=(0, 63), subplots=(8, 8))
+        return time.perf_counter() - start
+
+def main():
+    ''' Print timing for each prefetch depth and dask scheduler '''
+    if len(sys.argv) == 5:
+        # Subprocess: run one case
+        print(run_case(sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4]))
+        return
+
+    if len(sys.argv) not in (2, 3):
+        sys.exit(__doc__)
+    ps_path = sys.argv[1]
+    iter_axis = sys.argv[2] if len(sys.argv) == 3 else 'time'
+
+    from vidavis.plot.ms_plot._ms_plot_constants import ITER_PREFETCH_DEPTH # pylint: disable=import-outside-toplevel
+    print(f"cpu count {os.cpu_count()}, default prefetch depth {ITER_PREFETCH_DEPTH}")
+    print(f"{'depth':>5} {'scheduler':>11} {'time (s)':>9}")
+    for depth in sorted({1, 2, ITER_PREFETCH_DEPTH}):
+        for scheduler in ['synchronous', 'threads']:
+            result = subprocess.run([sys.executable, __file__, ps_path, iter_axis, str(depth), scheduler],
+                capture_output=True, text=True, check=True)
+            plot_time = float(result.stdout.strip().splitlines()[-1])
+            print(f"{depth:>5} {scheduler:>11} {plot_time:>9.2f}")
+
+if __name__ == '__main__':
+    main()
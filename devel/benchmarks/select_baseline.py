@@ -0,0 +1,89 @@
+'''
+Benchmark baseline/antenna selection in select_ms for large arrays.
+
+Compares the previous implementation (xarray boolean sel() per antenna or baseline)
+with the numpy implementation (np.isin on antenna names for all selections at once),
+and checks that both select the same baseline ids.
+
+    python devel/benchmarks/select_baseline.py
+'''
+
+import time
+
+import numpy as np
+import xarray as xr
+
+from vidavis.data.measurement_set.processing_set._ps_select import _select_baseline
+
+def list_select_baseline_ids(ms_xds, selection):
+    ''' Previous _select_baseline, returns selected baseline ids '''
+    baseline_ids = []
+    baseline_xda = ms_xds.baseline_id
+    for key, val in selection.items():
+        items = [val] if isinstance(val, str) else val
+        for item in items:
+            baseline_ids.extend(list_get_baseline_ids(baseline_xda, key, item))
+    return sorted(list(set(baseline_ids)))
+
+def list_get_baseline_ids(baseline_xda, key, val):
+    ''' Previous _get_baseline_ids '''
+    antenna1 = None
+    antenna2 = None
+    if key == 'baseline':
+        ant1, ant2 = val.split('&')
+        antenna1 = ant1.strip()
+        antenna2 = ant2.strip()
+    elif key == 'antenna1':
+        antenna1 = val
+    elif key == 'antenna2':
+        antenna2 = val
+
+    sel_baseline_xda = None
+    if antenna1 is not None:
+        sel_baseline_xda = baseline_xda.sel(baseline_id=baseline_xda.baseline_antenna1_name==antenna1)
+    if antenna2 is not None:
+        if sel_baseline_xda is None:
+            sel_baseline_xda = baseline_xda.sel(baseline_id=baseline_xda.baseline_antenna2_name==antenna2)
+        else:
+            sel_baseline_xda = sel_baseline_xda.sel(baseline_id=sel_baseline_xda.baseline_antenna2_name==antenna2)
+    if sel_baseline_xda is not None and sel_baseline_xda.size > 0:
+        return sel_baseline_xda.values.tolist()
+    return []
+
+def make_ms_xds(num_antennas):
+    ''' Return Dataset with baseline_id and antenna name coordinates for all baselines including autocorrelations '''
+    names = np.array([f"ea{idx:03d}" for idx in range(num_antennas)])
+    ant1, ant2 = np.triu_indices(num_antennas)
+    return xr.Dataset(coords={
+        'baseline_id': np.arange(ant1.size),
+        'baseline_antenna1_name': ('baseline_id', names[ant1]),
+        'baseline_antenna2_name': ('baseline_id', names[ant2]),
+    })
+
+def main():
+    ''' Print timing for antenna and baseline selections '''
+    rng = np.random.default_rng(0)
+    print(f"{'antennas':>8} {'baselines':>9} {'selection':>24} {'list (s)':>9} {'numpy (s)':>9}")
+    for num_antennas in [27, 64, 300]:
+        ms_xds = make_ms_xds(num_antennas)
+        names = np.unique(ms_xds.baseline_antenna1_name.values)
+        antennas = rng.choice(names, size=min(100, num_antennas // 3), replace=False).tolist()
+        baselines = [f"{ant1} & {ant2}" for ant1, ant2 in zip(antennas[:-1], antennas[1:]) if ant1 < ant2]
+
+        for label, selection in [
+            (f"{len(antennas)} antenna1", {'antenna1': antennas}),
+            (f"{len(antennas)} antenna1+2", {'antenna1': antennas, 'antenna2': antennas}),
+            (f"{len(baselines)} baselines", {'baseline': baselines})]:
+            start = time.perf_counter()
+            list_ids = list_select_baseline_ids(ms_xds, selection)
+            list_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            selected_xds, _ = _select_baseline(ms_xds, selection)
+            np_time = time.perf_counter() - start
+
+            assert list_ids == np.atleast_1d(selected_xds.baseline_id.values).tolist(), f"{label}: baseline ids differ"
+            print(f"{num_antennas:>8} {ms_xds.baseline_id.size:>9} {label:>24} {list_time:>9.3f} {np_time:>9.3f}")
+
+if __name__ == '__main__':
+    main()
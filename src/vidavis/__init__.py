@@ -38,4 +38,4 @@ except ModuleNotFoundError:
     ###
     __version__ = {}
 
-from .apps import MsRaster
+from .apps import MsRaster, serve_msraster
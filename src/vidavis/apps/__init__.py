@@ -1,3 +1,3 @@
 '''End user applications supplied by ``vidavis``.'''
 
-from ._ms_raster import MsRaster
+from ._ms_raster import MsRaster, serve_msraster
@@ -2,6 +2,10 @@
 Implementation of the ``MsRaster`` application for measurement set raster plotting and editing
 '''
 
+# pylint: disable=too-many-lines
+
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import threading
 import time
 
@@ -9,12 +13,18 @@ from bokeh.models.formatters import NumeralTickFormatter
 import holoviews as hv
 import numpy as np
 from pandas import to_datetime
+import panel as pn
+from panel.io.state import set_curdoc
+from toolviper.utils.logger import setup_logger
 
 from vidavis.bokeh._palette import available_palettes
 from vidavis.data.measurement_set.processing_set._ps_coords import set_index_coordinates
 from vidavis.plot.ms_plot._ms_plot import MsPlot
 from vidavis.plot.ms_plot._ms_plot_constants import VIS_AXIS_OPTIONS, SPECTRUM_AXIS_OPTIONS, PS_SELECTION_OPTIONS, MS_SELECTION_OPTIONS
-from vidavis.plot.ms_plot._plot_inputs import inputs_changed
+from vidavis.plot.ms_plot._ms_plot_constants import AUTO_FAST_PERCENTILES, AUTO_FAST_SAMPLE_FRACTION, GUI_DERIVED_INPUTS, GUI_RENDER_INPUTS
+from vidavis.plot.ms_plot._ms_plot_constants import ITER_PREFETCH_DEPTH
+from vidavis.plot.ms_plot._plot_inputs import get_changed_inputs, inputs_changed
+from vidavis.plot.ms_plot._plot_scheduler import PlotScheduler, PlotCancelled, cancellable_compute
 from vidavis.plot.ms_plot._raster_plot import RasterPlot
 from vidavis.plot.ms_plot._raster_plot_gui import create_raster_gui
 from vidavis.plot.ms_plot._raster_plot_inputs import RasterPlotInputs
@@ -29,6 +39,8 @@ class MsRaster(MsPlot):
         log_level (str): logging threshold. Options include 'debug', 'info', 'warning', 'error', 'critical'. Default 'info'.
         log_to_file (bool): whether to write log messages to log file "msraster-<timestamp>.log". Default True.
         show_gui (bool): whether to launch the interactive GUI in a browser tab. Default False.
+        chunk_axes (None, tuple): (x_axis, y_axis) of raster plots to chunk zarr data for when converting MSv2.
+            Default None uses xradio default chunks.
 
     Example:
         from vidavis.apps import MsRaster
@@ -41,8 +53,9 @@ class MsRaster(MsPlot):
         msr.save() # saves as {ms name}_raster.png
     '''
 
-    def __init__(self, ms=None, log_level="info", log_to_file=True, show_gui=False):
-        super().__init__(ms, log_level, log_to_file, show_gui, "MsRaster")
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+    def __init__(self, ms=None, log_level="info", log_to_file=True, show_gui=False, chunk_axes=None):
+        super().__init__(ms, log_level, log_to_file, show_gui, "MsRaster", chunk_axes)
         self._plot_inputs = RasterPlotInputs()
         self._plot_inputs.set_input('ms', self._ms_info['ms'])
         self._raster_plot = RasterPlot()
@@ -52,6 +65,14 @@ class MsRaster(MsPlot):
         self._spw_color_limits = {}
 
         if show_gui:
+            # Open MS selected in gui in background thread, one load at a time
+            self._load_executor = ThreadPoolExecutor(max_workers=1)
+            self._load_id = 0 # latest load; supersedes previous loads
+            self._load_future = None
+
+            # Compute plots requested in gui in worker thread, latest request only
+            self._plot_scheduler = PlotScheduler(self._logger)
+
             # Set default style and plot inputs to use for empty plot and gui
             self.set_style_params()
             self.plot()
@@ -67,6 +88,7 @@ class MsRaster(MsPlot):
                 self._set_filename(self._ms_info['ms'])
                 self._update_gui_ms_options()
                 self._update_plot(do_plot=True)
+# pylint: enable=too-many-arguments, too-many-positional-arguments
 
     def colormaps(self):
         ''' List available colormap (Bokeh palettes). '''
@@ -145,7 +167,8 @@ class MsRaster(MsPlot):
 
 # pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals, unused-argument
     def plot(self, x_axis='baseline', y_axis='time', vis_axis='amp', aggregator=None, agg_axis=None,
-             iter_axis=None, iter_range=None, subplots=None, color_mode=None, color_range=None, title=None, clear_plots=True):
+             iter_axis=None, iter_range=None, subplots=None, color_mode=None, color_range=None, title=None, clear_plots=True,
+             rasterize=False, pyramid=False, raster_reduction='max', compact=False, locate=True):
         '''
         Create a raster plot of vis_axis data.
         Plot axes include data dimensions (time, baseline/antenna_name, frequency, polarization).
@@ -156,7 +179,9 @@ class MsRaster(MsPlot):
             y_axis (str): Plot y-axis. Default 'time'.
             vis_axis (str): Complex visibility component to plot (amp, phase, real, imag). Default 'amp'.
             aggregator (None, str): reduction for rasterization. Default None.
-                Options include 'max', 'mean', 'min', 'std', 'sum', 'var'.
+                Options include 'max', 'mean', 'median', 'min', 'std', 'sum', 'var'.
+                Unflagged data is aggregated, or flagged data where all data is flagged. Median is approximate for
+                more than 64 values.
             agg_axis (None, str, list): which dimension to apply aggregator across. Default None.
                 Options include one or more dimensions.
                 If agg_axis is None and aggregator is set, aggregates over all non-axis dimensions.
@@ -170,13 +195,27 @@ class MsRaster(MsPlot):
                 Use with iter_axis and iter_range, or clear_plots=False.
                 If used in multiple calls, the last subplots tuple will be used to determine grid to show or save.
             color_mode (None, str): Whether to limit range of colorbar.  Default None (no limit).
-                Options include None (use data limits), 'auto' (calculate limits for amplitude), and 'manual' (use range in color_range).
-                'auto' is equivalent to None if vis_axis is not 'amp'.
+                Options include None (use data limits), 'auto' (calculate limits for amplitude), 'auto_fast' (estimate
+                amplitude percentile limits from a sample of the data), and 'manual' (use range in color_range).
+                'auto' and 'auto_fast' are equivalent to None if vis_axis is not 'amp'.
                 When subplots is set, the 'auto' or 'manual' range will be used for all plots.
             color_range (None, tuple): (min, max) of colorbar to use if color_mode is 'manual'.
             title (None, str): Plot title, default None (no title)
                 Set title='ms' to generate title from ms name and iter_axis value, if any.
             clear_plots (bool): whether to clear list of plots. Default True.
+            rasterize (bool): whether to rasterize the plot on the server to screen resolution (requires datashader).
+                The plot is re-aggregated for each zoom and pan when shown. Recommended for large plots. Default False.
+            pyramid (bool): whether to build a multi-resolution pyramid of the plot data, reduced 2x2 per level.
+                Zoom and pan show the pyramid level closest to screen resolution. Cannot be used with rasterize.
+                Default False.
+            raster_reduction (str): reduction for rasterize or pyramid, applied to data values which share a screen pixel.
+                Options include 'max', 'mean', and 'first'. Default 'max'.
+            compact (bool): whether to send compact plot data to the browser: float32 values, as an image when the plot
+                axes are on a regular grid (gaps filled with NaN), with flagged data cropped to the flagged region.
+                Default False.
+            locate (bool): whether to include data group weight and uvw and other MS data in plot data to locate points
+                when the plot is shown. Set False to read and reduce only the visibilities and flags, e.g. when plots are
+                only saved. Not included for a layout, which does not support locate. Default True.
 
         If plot is successful, use show() or save() to view/save the plot.
         '''
@@ -250,12 +289,18 @@ class MsRaster(MsPlot):
 
         # Select vis_axis data to plot and update selection; returns xarray Dataset
         raster_data = self._ms_data.get_raster_data(self._plot_inputs.get_inputs())
+        if self._show_gui:
+            self._last_raster_data = raster_data # replot if only render inputs change
+        return self._plot_raster_data(raster_data)
 
+    def _plot_raster_data(self, raster_data):
+        ''' Create plot of raster data (xarray Dataset) using plot inputs '''
         # Save plot data for plot location callbacks unless layout (location not supported)
         if not self._plot_inputs.is_layout():
             x_axis = self._plot_inputs.get_input('x_axis')
             y_axis = self._plot_inputs.get_input('y_axis')
             self._plot_data = set_index_coordinates(raster_data, (x_axis, y_axis))
+            self._locate_index = None # build for new plot data
 
         # Add params needed for plot: auto color range and ms name
         self._set_auto_color_range() # set calculated limits if auto mode
@@ -271,8 +316,9 @@ class MsRaster(MsPlot):
         # Make plot. Add data min/max if GUI is shown to update color limits range.
         return self._raster_plot.raster_plot(raster_data, self._logger, self._show_gui)
 
-    def _do_iter_plot(self):
-        ''' Create one plot per iteration value in iter_range which fits into subplots '''
+    def _do_iter_plot(self, cancel_event=None):
+        ''' Create one plot per iteration value in iter_range which fits into subplots.
+            If cancel_event is set by a newer GUI plot request, pending computations stop and PlotCancelled is raised. '''
         # Default (0, 0) (first iteration only). Use (0, -1) for all iterations.
         # If subplots is a grid, end iteration index is limited by the grid size.
         # If subplots is a single plot, all iteration plots in the range can be saved using export_range in save().
@@ -306,18 +352,63 @@ class MsRaster(MsPlot):
             end_idx = end_idx.item() if isinstance(end_idx, np.int64) else end_idx
             self._plot_inputs.set_input('auto_iter_range', (start_idx, end_idx - 1))
 
-        for i in range(start_idx, end_idx):
-            # Select iteration value and make plot
+        self._plot_iterations(iter_axis, iter_values, range(start_idx, end_idx), cancel_event)
+
+    def _plot_iterations(self, iter_axis, iter_values, iter_indices, cancel_event):
+        ''' Create plot for each index in iter_indices with its iter_axis value selected '''
+        # Each iteration uses a copy of the plot inputs with its iter_axis value selected
+        iter_inputs = []
+        for i in iter_indices:
+            inputs = self._plot_inputs.get_inputs().copy()
+            inputs['selection'] = inputs['selection'] | {iter_axis: iter_values[i]}
+            iter_inputs.append(inputs)
+
+        raster_futures = self._prefetch_raster_data(iter_inputs, cancel_event)
+        for i, inputs, raster_future in zip(iter_indices, iter_inputs, raster_futures):
             value = iter_values[i]
             self._logger.info("Plot %s iteration index %s value %s", iter_axis, i, value)
-            self._plot_inputs.set_selection({iter_axis: value})
             try:
-                plot = self._do_plot()
+                raster_data = raster_future.result()
+                # Plot uses this iteration's selection, not one left from a previous iteration
+                if 'dim_selection' in inputs:
+                    self._plot_inputs.set_input('dim_selection', inputs['dim_selection'])
+                else:
+                    self._plot_inputs.remove_input('dim_selection')
+                plot = self._plot_raster_data(raster_data)
                 self._plots.append(plot)
             except RuntimeError as e:
                 self._logger.info("Iteration plot for value %s failed: %s", str(value), str(e))
                 continue
 
+    def _prefetch_raster_data(self, iter_inputs, cancel_event):
+        ''' Generate future raster data for each iteration inputs in order, computed in worker threads ahead of
+            creating plots. Workers compute with the threaded dask scheduler, and planes in memory are limited by
+            prefetch depth. If cancel_event is set, pending computations do not start and PlotCancelled is raised. '''
+        num_workers = min(len(iter_inputs), ITER_PREFETCH_DEPTH)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            raster_futures = [executor.submit(self._get_iter_raster_data, inputs, cancel_event)
+                for inputs in iter_inputs[:num_workers]]
+
+            for i in range(len(iter_inputs)):
+                if cancel_event and cancel_event.is_set():
+                    # Running computations stop at next task
+                    for future in raster_futures[i:]:
+                        future.cancel()
+                    raise PlotCancelled()
+
+                if i + num_workers < len(iter_inputs):
+                    raster_futures.append(executor.submit(self._get_iter_raster_data, iter_inputs[i + num_workers],
+                        cancel_event))
+                yield raster_futures[i]
+                raster_futures[i] = None # plot holds data
+
+    def _get_iter_raster_data(self, inputs, cancel_event):
+        ''' Return raster data for iteration inputs, computed in prefetch worker thread unless plot request is cancelled '''
+        if cancel_event and cancel_event.is_set():
+            raise PlotCancelled()
+        with cancellable_compute(cancel_event):
+            return self._ms_data.get_raster_data(inputs)
+
     def _init_plot(self):
         ''' Apply automatic selection '''
         # Remove previous auto selections
@@ -345,6 +436,10 @@ class MsRaster(MsPlot):
         # Print data info for spw selection
         self._logger.info("Plotting %s msv4 datasets.", self._ms_data.get_num_ms())
         self._logger.info("Maximum dimensions for selected spw: %s", self._ms_data.get_max_data_dims())
+
+        # Include data to locate points unless disabled or layout (locate not supported)
+        locate_data = self._plot_inputs.get_input('locate') is not False and not self._plot_inputs.is_layout()
+        self._plot_inputs.set_input('locate_data', locate_data)
         self._plot_init = True
 
     def _set_auto_color_range(self):
@@ -352,20 +447,23 @@ class MsRaster(MsPlot):
         color_mode = self._plot_inputs.get_input('color_mode')
         auto_color_limits = None
 
-        if color_mode == 'auto':
+        if color_mode in ['auto', 'auto_fast']:
             if self._plot_inputs.get_input('vis_axis') == 'amp' and not self._plot_inputs.get_input('aggregator'):
                 # For amplitude, limit colorbar range using stored per-spw ms stats
                 spw_name = self._plot_inputs.get_selection('spw_name')
                 if not spw_name:
                     spw_name = self._plot_inputs.get_input('auto_spw')
 
-                if spw_name in self._spw_color_limits:
-                    auto_color_limits = self._spw_color_limits[spw_name]
+                if (spw_name, color_mode) in self._spw_color_limits:
+                    auto_color_limits = self._spw_color_limits[(spw_name, color_mode)]
                 else:
                     # Select spw name and data group only, no dimensions
                     data_group = self._plot_inputs.get_input('data_group')
                     spw_data_selection = {'spw_name': spw_name, 'data_group_name': data_group}
-                    auto_color_limits = self._calc_amp_color_limits(spw_data_selection)
+                    if color_mode == 'auto':
+                        auto_color_limits = self._calc_amp_color_limits(spw_data_selection)
+                    else:
+                        auto_color_limits = self._calc_fast_amp_color_limits(spw_data_selection)
 
                     if auto_color_limits:
                         # Convert to float for listing plot inputs
@@ -373,7 +471,7 @@ class MsRaster(MsPlot):
                         start = start.item() if isinstance(start, np.float64) else start
                         end = end.item() if isinstance(end, np.float64) else end
                         auto_color_limits = (start, end)
-                    self._spw_color_limits[spw_name] = auto_color_limits
+                    self._spw_color_limits[(spw_name, color_mode)] = auto_color_limits
         self._plot_inputs.set_input('auto_color_range', auto_color_limits)
 
         if auto_color_limits:
@@ -407,6 +505,21 @@ class MsRaster(MsPlot):
         self._logger.debug("Stats elapsed time: %.2fs.", time.time() - start)
         return color_limits
 
+    def _calc_fast_amp_color_limits(self, selection):
+        # Estimate colorbar limits from amplitude percentiles for a sample of unflagged data in selected spw
+        self._logger.info("Estimating percentiles from %.0f%% of data for colorbar limits.", AUTO_FAST_SAMPLE_FRACTION * 100.0)
+        start = time.time()
+
+        quantiles = tuple(percentile / 100.0 for percentile in AUTO_FAST_PERCENTILES)
+        amp_quantiles = self._ms_data.get_vis_quantiles(selection, 'amp', quantiles, AUTO_FAST_SAMPLE_FRACTION)
+        if not amp_quantiles:
+            return None # autoscale
+
+        clip_min, clip_max = amp_quantiles
+        color_limits = None if clip_min == clip_max else (clip_min, clip_max)
+        self._logger.debug("Percentiles elapsed time: %.2fs.", time.time() - start)
+        return color_limits
+
     def _reset_plot(self, clear_plots=True):
         ''' Reset any plot settings for a new plot '''
         # Clear plot list
@@ -429,6 +542,7 @@ class MsRaster(MsPlot):
             'select_filename': self._select_filename,
             'style': self._set_style_params,
             'color': self._set_color_range,
+            'rasterize': self._set_rasterize,
             'axes': self._set_axes,
             'select_ps': self._set_ps_selection,
             'select_ms': self._set_ms_selection,
@@ -448,6 +562,9 @@ class MsRaster(MsPlot):
         }
 
         self._panel = create_raster_gui(callbacks, plot_info, self._empty_plot)
+        if self._is_server_session():
+            # Panel is shown by server session (see serve_msraster)
+            return
 
         # Start Panel server in a background daemon thread so it doesn't block process exit.
         # Note: The Panel server will automatically stop when the Python process exits.
@@ -461,82 +578,131 @@ class MsRaster(MsPlot):
     ###
     ### Main callback to create plot if inputs changed
     ###
-# pylint: disable=too-many-arguments, too-many-positional-arguments
     def _update_plot(self, do_plot):
-        ''' Create plot with inputs from GUI, or update cursor/box location.
-            Callbacks:
-                do_plot (Plot button clicked) - return plot with inputs from GUI
-            This function *must* return plot, even if empty plot or last plot, for DynamicMap.
+        ''' Callback for Plot button: schedule plot with inputs from GUI in plot worker thread.
+            Requests are debounced, and a newer request cancels the previous plot computation.
         '''
         if not do_plot or not self._panel:
             return
 
+        if self._load_future and not self._load_future.done():
+            self._notify("Cannot plot until MS is opened", 'warning')
+            return
+
         # Remove toast notification and collapse selection accordion
         if self._toast:
             self._toast.destroy()
         self._get_selector("selectors").active = []
-        gui_plot = None
 
-        if self._plot_inputs.get_input('ms'):
-            # Start spinner
-            self._update_plot_status(True)
-            self._update_plot_spinner(True)
+        # Start spinner
+        self._update_plot_status(True)
+        self._update_plot_spinner(True)
 
-            # Clear last plot
-            self._reset_plot()
-            self.clear_selection()
-            if 'ps_selection' in self._gui_selection or 'ms_selection' in self._gui_selection:
-                self._do_gui_selection()
+        doc = pn.state.curdoc
+        self._plot_scheduler.submit(lambda cancel_event: self._make_gui_plot(cancel_event, doc))
 
-            # Make plot if first plot or changed plot
+    def _make_gui_plot(self, cancel_event, doc):
+        ''' Create plot with inputs from GUI and show it in gui session document, unless cancelled by newer request.
+            Only the stages affected by changed inputs are done (see _get_gui_update_stage). '''
+        with set_curdoc(doc):
+            # Inputs for this request; gui callbacks may change inputs during computation
             style_inputs = self._raster_plot.get_plot_params()['style']
             plot_inputs = self._plot_inputs.get_inputs()
-            if inputs_changed(plot_inputs, self._last_plot_inputs) or inputs_changed(style_inputs, self._last_style_inputs):
-                try:
-                    # Check inputs from GUI then plot
-                    self._plot_inputs.set_input('data_dims', self._ms_info['data_dims'])
-                    self._plot_inputs.check_inputs()
-                    gui_plot = self._do_gui_plot()
-                    self._last_plot = gui_plot # save plot for callback
-                    self._logger.info("Plot update complete")
-
-                    # Put plot with dmap for locate streams in gui panel
-                    dmap = self._get_locate_dmaps()
-                    self._panel[0][0].object = gui_plot * dmap
-                except (ValueError, TypeError, KeyError, RuntimeError) as e:
-                    # Clear plot, inputs invalid
-                    self._notify(str(e), 'error', 0)
-
-        # Update plot inputs for gui tab
-        self._set_plot_params(plot_inputs | style_inputs)
-        self._show_plot_inputs()
-
-        # Save inputs to check if changed next time
-        self._last_plot_inputs = plot_inputs.copy()
-        self._last_style_inputs = style_inputs.copy()
-
-        # Add plot inputs to GUI, change plot button to outline, and stop spinner
-        self._update_plot_status(False)
-        self._update_plot_spinner(False)
-# pylint: enable=too-many-arguments, too-many-positional-arguments
-
-    def _do_gui_selection(self):
+            request_inputs = plot_inputs.copy()
+
+            if self._plot_inputs.get_input('ms'):
+                gui_selection = copy.deepcopy(self._gui_selection)
+                update_stage = self._get_gui_update_stage(request_inputs, style_inputs, gui_selection)
+                self._logger.debug("GUI plot update stage: %s", update_stage)
+
+                if update_stage:
+                    try:
+                        if update_stage == 'selection':
+                            # Restore original ProcessingSet and apply gui selection
+                            self._last_gui_selection = None
+                            self.clear_selection()
+                            self._do_gui_selection(gui_selection)
+                            self._last_gui_selection = gui_selection
+
+                        # Clear last plot, check inputs from GUI, then plot
+                        self._reset_plot()
+                        self._plot_inputs.set_input('data_dims', self._ms_info['data_dims'])
+                        self._plot_inputs.check_inputs()
+                        if update_stage == 'render':
+                            gui_plot = self._do_gui_render()
+                        else:
+                            self._last_raster_data = None
+                            gui_plot = self._do_gui_plot(cancel_event)
+                        if cancel_event.is_set():
+                            raise PlotCancelled()
+                        self._get_locate_index() # compute cursor locate values in worker
+                        self._last_plot = gui_plot # save plot for callback
+                        self._logger.info("Plot update complete")
+
+                        # Put plot with dmap for locate streams in gui panel
+                        dmap = self._get_locate_dmaps()
+                        self._panel[0][0].object = gui_plot * dmap
+                    except (ValueError, TypeError, KeyError, RuntimeError) as e:
+                        # Clear plot, inputs invalid
+                        self._last_raster_data = None
+                        self._notify(str(e), 'error', 0)
+
+                style_inputs = self._raster_plot.get_plot_params()['style']
+                plot_inputs = self._plot_inputs.get_inputs()
+
+            # Update plot inputs for gui tab
+            self._set_plot_params(plot_inputs | style_inputs)
+            self._show_plot_inputs()
+
+            # Save inputs to check if changed next time, with values for this request
+            self._last_plot_inputs = plot_inputs | request_inputs
+            self._last_style_inputs = style_inputs.copy()
+
+            # Add plot inputs to GUI, change plot button to outline, and stop spinner
+            self._update_plot_status(False)
+            self._update_plot_spinner(False)
+
+    def _get_gui_update_stage(self, plot_inputs, style_inputs, gui_selection):
+        ''' Return first stage of plot update needed for inputs changed since last plot:
+            'selection' if ms or selection changed (apply selection to original ProcessingSet, then plot),
+            'data' if plot axes, aggregation, or iteration changed (get raster data from selected ProcessingSet, then plot),
+            'render' if only style, color, title, or transport changed (plot last raster data),
+            or None if unchanged. '''
+        if not self._last_plot_inputs or plot_inputs['ms'] != self._last_plot_inputs['ms'] or \
+            gui_selection != self._last_gui_selection:
+            return 'selection'
+
+        changed_inputs = get_changed_inputs(plot_inputs, self._last_plot_inputs, GUI_DERIVED_INPUTS)
+        if any(name not in GUI_RENDER_INPUTS for name in changed_inputs):
+            return 'data'
+        if changed_inputs or inputs_changed(style_inputs, self._last_style_inputs):
+            can_render = self._last_raster_data is not None and not plot_inputs.get('iter_axis')
+            return 'render' if can_render else 'data'
+        return None
+
+    def _do_gui_selection(self, gui_selection):
         ''' Apply selections selected in GUI '''
-        if self._gui_selection['ps_selection']:
-            self.select_ps(**self._gui_selection['ps_selection'])
-        if self._gui_selection['ms_selection']:
-            self.select_ms(**self._gui_selection['ms_selection'], drop=True)
+        if gui_selection.get('ps_selection'):
+            self.select_ps(**gui_selection['ps_selection'])
+        if gui_selection.get('ms_selection'):
+            self.select_ms(**gui_selection['ms_selection'], drop=True)
+
+    def _do_gui_render(self):
+        ''' Create plot from last raster data with changed style and plot params '''
+        gui_plot = self._plot_raster_data(self._last_raster_data)
+        self._update_color_range(self._raster_plot.get_plot_params())
+        return gui_plot
 
     ###
     ### Create plot for DynamicMap
     ###
-    def _do_gui_plot(self):
-        ''' Create plot based on gui plot inputs '''
+    def _do_gui_plot(self, cancel_event=None):
+        ''' Create plot based on gui plot inputs; iteration plot computation stops if cancel_event is set. '''
         if self._ms_data and self._ms_data.is_valid():
             try:
                 if self._plot_inputs.get_input('iter_axis'):
                     # Make iter plot (possibly with subplots layout)
-                    self._do_iter_plot()
+                    self._do_iter_plot(cancel_event)
                     subplots = self._plot_inputs.get_input('subplots')
                     layout_plot = super()._layout_plots(subplots)
                     if self._plot_inputs.is_layout():
@@ -605,6 +771,13 @@ class MsRaster(MsPlot):
 
     def _update_gui_ms_options(self):
         ''' Set gui options from ms data '''
+        self._update_gui_axis_options()
+        selection_selectors = self._get_selector('sel')
+        self._update_ps_selection_options(selection_selectors[0][0])
+        self._update_ms_selection_options(selection_selectors[0][1])
+
+    def _update_gui_axis_options(self):
+        ''' Set axis, aggregation, and iteration gui options from ms data dimensions '''
         if 'data_dims' in self._ms_info:
             data_dims = self._ms_info['data_dims']
             axis_selectors = self._get_selector('axes')
@@ -639,11 +812,6 @@ class MsRaster(MsPlot):
             else:
                 vis_axis_selector.value = VIS_AXIS_OPTIONS[0]
 
-            # Update options for selection selector
-            selection_selectors = self._get_selector('sel')
-            self._update_ps_selection_options(selection_selectors[0][0])
-            self._update_ms_selection_options(selection_selectors[0][1])
-
             # Update options for agg axes selector
             agg_selectors = self._get_selector('agg')
             agg_selectors[1].options = data_dims
@@ -766,15 +934,69 @@ class MsRaster(MsPlot):
     ### Callbacks for widgets which update plot inputs
     ###
     def _set_filename(self, filename):
-        ''' Set ms input from file text input '''
+        ''' Set ms input from file text input and open ms in background thread, superseding pending load.
+            Current MsData is kept until the new ms is opened, since a scheduled plot may be using it. '''
         self._plot_inputs.set_input('ms', filename)
-        if self._set_ms(filename):
-            # New MS set, update gui input options
+        self._ms_info['ms'] = filename
+        self._load_id += 1
+        if self._load_future:
+            self._load_future.cancel() # if not started
+        self._plot_scheduler.cancel() # plot of previous ms is stale
+
+        if not filename or (self._ms_data and self._ms_data.is_ms_path(filename)):
+            self._update_plot_spinner(False)
+            return
+
+        self._update_plot_spinner(True)
+        self._load_future = self._load_executor.submit(self._load_ms, filename, self._load_id, pn.state.curdoc)
+
+    def _load_ms(self, filename, load_id, doc):
+        ''' Open ms then fill gui options in stages, with progress notifications in gui session document.
+            Stops before the next stage if superseded by a newer load. '''
+        with set_curdoc(doc):
             try:
-                self._update_gui_ms_options()
+                self._notify(f"Opening {filename}", 'info', 0)
+                ms_data = self._open_ms(filename)
+                if self._is_superseded(load_id, filename):
+                    return
+                self._plot_scheduler.cancel(wait=True) # swap MsData when no plot is using it
+                self._set_ms_data(ms_data)
+                self._update_gui_axis_options()
+
+                selection_selectors = self._get_selector('sel')
+                self._notify("Reading ProcessingSet summary", 'info', 0)
+                self._update_ps_selection_options(selection_selectors[0][0])
+                if self._is_superseded(load_id, filename):
+                    return
+
+                self._notify("Reading dimension values", 'info', 0)
+                self._update_ms_selection_options(selection_selectors[0][1])
+                if self._is_superseded(load_id, filename):
+                    return
+
+                self._notify(f"Opened {filename}", 'success')
                 self._update_plot_status(True) # Change plot button to solid
-            except AttributeError:
-                self._update_plot_status(False)
+            except Exception as e: # pylint: disable=broad-exception-caught
+                # Load future is discarded, so handle all errors here and do not raise.
+                # RuntimeError is an ms error; log traceback of unexpected error.
+                message = str(e)
+                if not isinstance(e, RuntimeError):
+                    self._logger.exception("Loading %s failed", filename)
+                    message = f"Loading {filename} failed: {e!r}"
+                if load_id == self._load_id:
+                    self._plot_scheduler.cancel(wait=True)
+                    self._ms_data = None # cannot plot ms input
+                    self._notify(message, 'error', 0)
+            finally:
+                if load_id == self._load_id:
+                    self._update_plot_spinner(False)
+
+    def _is_superseded(self, load_id, filename):
+        ''' Return whether ms load was superseded by newer filename '''
+        if load_id != self._load_id:
+            self._logger.debug("Load of %s superseded", filename)
+            return True
+        return False
 
     def _set_title(self, title):
         ''' Set title from gui text input '''
@@ -790,6 +1012,11 @@ class MsRaster(MsPlot):
         self._plot_inputs.set_color_inputs(color_mode, color_range)
         self._update_plot_status(True) # Change plot button to solid
 
+    def _set_rasterize(self, rasterize, pyramid, raster_reduction, compact):
+        ''' Set server-side rasterization, pyramid, and compact transport params from gui '''
+        self._plot_inputs.set_rasterize_inputs(rasterize, pyramid, raster_reduction, compact)
+        self._update_plot_status(True) # Change plot button to solid
+
     def _set_axes(self, x_axis, y_axis, vis_axis):
         ''' Set plot axis inputs from gui '''
         self._plot_inputs.set_axis_inputs(x_axis, y_axis, vis_axis)
@@ -843,3 +1070,38 @@ class MsRaster(MsPlot):
         self._gui_selection['ms_selection'] = ms_selection
         self._update_plot_status(True) # Change plot button to solid
 # pylint: enable=too-many-arguments, too-many-positional-arguments, unused-argument
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def serve_msraster(ms=None, port=5006, address=None, show=True, log_level="info", log_to_file=True, chunk_axes=None):
+    '''
+    Serve the MsRaster GUI to multiple browser sessions from this process. Blocks until the server is stopped.
+    Each session has its own plot inputs, selections, and plots. Sessions using the same MS share its opened
+    ProcessingSet, summary, dimension values, selection cache, and stats cache.
+
+    Args:
+        ms (str, None): path to MSv2 (.ms) or MSv4 (.zarr) file to open in each new session. Default None.
+        port (int): port for server. Default 5006.
+        address (str, None): address for server to listen on. Default None (all addresses).
+        show (bool): whether to open a browser tab for the server. Default True.
+        log_level (str): logging threshold. Options include 'debug', 'info', 'warning', 'error', 'critical'. Default 'info'.
+        log_to_file (bool): whether to write log messages to log file "msraster-<timestamp>.log". Default True.
+        chunk_axes (None, tuple): (x_axis, y_axis) of raster plots to chunk zarr data for when converting MSv2.
+            Default None uses xradio default chunks.
+
+    Example:
+        from vidavis.apps import serve_msraster
+        serve_msraster(ms='myvis.ms', port=5006)
+    '''
+    setup_logger("MsRaster", log_to_term=True, log_to_file=log_to_file, log_file="msraster", log_level=log_level.upper())
+
+# pylint: disable=protected-access
+    def create_session():
+        # Open ms in background so session is shown while loading
+        msr = MsRaster(None, log_level, log_to_file, show_gui=True, chunk_axes=chunk_axes)
+        if ms:
+            msr._select_filename([ms])
+        return msr._panel
+# pylint: enable=protected-access
+
+    pn.serve(create_session, port=port, address=address, show=show, title="MsRaster", threaded=False)
+# pylint: enable=too-many-arguments, too-many-positional-arguments
@@ -11,12 +11,12 @@ class MsData:
     Current backend implementation is PsData using xradio Processing Set.
     '''
 
-    def __init__(self, ms_path, logger):
+    def __init__(self, ms_path, logger, chunk_axes=None):
         self._ms_path = ms_path
         self._logger = logger
         self._data = None
         self._data_initialized = False
-        self._init_data(ms_path)
+        self._init_data(ms_path, chunk_axes)
 
     def is_valid(self):
         ''' Returns whether MS path has been set so data can be accessed. '''
@@ -166,6 +166,38 @@ class MsData:
         self._log_no_ms()
         return None
 
+    def get_vis_quantiles(self, selection, vis_axis, quantiles, sample_fraction):
+        ''' Returns estimated quantiles for data in data group selected by selection, from a sample of the data.
+                selection (dict): fields and values to select
+                vis_axis (str): complex component to apply to data
+                quantiles (tuple): quantile fractions (0-1) to estimate
+                sample_fraction (float): fraction of data chunks to read
+        '''
+        if self._data_initialized:
+            return self._data.get_vis_quantiles(selection, vis_axis, quantiles, sample_fraction)
+        self._log_no_ms()
+        return None
+
+    def get_chunk_report(self, data_group='base', plot_axes=None):
+        ''' Returns pandas DataFrame reporting zarr chunk reads for raster plots of plot axes.
+                data_group (str): data group of correlated data
+                plot_axes (None, list): list of (x_axis, y_axis), or None for common raster plot axes
+        '''
+        if self._data_initialized:
+            return self._data.get_chunk_report(data_group, plot_axes)
+        self._log_no_ms()
+        return None
+
+    def rechunk(self, out_path, plot_axes):
+        ''' Write copy of MeasurementSet data to out_path with chunks for raster plots of plot axes.
+                out_path (str): path of output zarr file
+                plot_axes (tuple): (x_axis, y_axis)
+        '''
+        if self._data_initialized:
+            self._data.rechunk(out_path, plot_axes)
+        else:
+            self._log_no_ms()
+
     def get_correlated_data(self, data_group):
         ''' Returns name of correlated data variable in Processing Set data group '''
         if self._data_initialized:
@@ -184,9 +216,9 @@ class MsData:
         ''' Standardized log message when path has not been set. '''
         self._logger.info("No MS path set, cannot access data")
 
-    def _init_data(self, ms_path):
+    def _init_data(self, ms_path, chunk_axes):
         ''' Data backend for MeasurementSet; currently xradio ProcessingSet '''
         if ms_path:
-            self._data = PsData(ms_path, self._logger)
+            self._data = PsData(ms_path, self._logger, chunk_axes)
             self._data_initialized = True
 #pylint: enable=too-many-public-methods
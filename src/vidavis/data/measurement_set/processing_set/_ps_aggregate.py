@@ -0,0 +1,255 @@
+'''
+Streaming aggregation of xarray DataArrays along dimensions, computed chunk by chunk from mergeable partial states
+so memory is bounded by the output plane rather than the aggregated dimensions.
+'''
+
+from functools import partial
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+# Maximum weighted values kept per output value to estimate median; exact if no more values are aggregated
+AGG_SKETCH_SIZE = 64
+
+# Partial states (besides count) needed to finalize each aggregator
+_AGGREGATOR_STATES = {
+    'max': ['max'],
+    'mean': ['sum'],
+    'median': ['sketch'],
+    'min': ['min'],
+    'std': ['mean', 'm2'],
+    'sum': ['sum'],
+    'var': ['mean', 'm2'],
+}
+
+def aggregate_xda(xda, aggregator, dims):
+    ''' Return xda reduced along dims with aggregator, ignoring nan values. Computation is lazy. '''
+    return xr.apply_ufunc(_aggregate, xda,
+        input_core_dims=[dims],
+        dask='allowed',
+        keep_attrs=True,
+        kwargs={'aggregator': aggregator, 'num_axes': len(dims)}
+    )
+
+def aggregate_flagged_xda(xda, flag_xda, aggregator, dims):
+    ''' Return xda and flag_xda reduced along dims with aggregator, ignoring nan values. Computation is lazy.
+        Unflagged values are aggregated with flag 0, or flagged values with flag 1 where all values are flagged. '''
+    agg_xda = xr.apply_ufunc(_aggregate, xda, flag_xda,
+        input_core_dims=[dims, dims],
+        dask='allowed',
+        keep_attrs=True,
+        kwargs={'aggregator': aggregator, 'num_axes': len(dims)}
+    )
+    agg_flag_xda = xr.apply_ufunc(_aggregate_flag, xda, flag_xda,
+        input_core_dims=[dims, dims],
+        dask='allowed',
+        kwargs={'num_axes': len(dims)}
+    )
+    agg_flag_xda.attrs = flag_xda.attrs
+    return agg_xda, agg_flag_xda
+
+def _aggregate(values, flags=None, aggregator=None, num_axes=1):
+    ''' Reduce last num_axes axes of values with aggregator as dask tree reduction of partial states.
+        Flags are passed as reduction weights so each chunk has values and flags. '''
+    values = da.asarray(values)
+    axis = tuple(range(values.ndim - num_axes, values.ndim))
+    dtype = values.dtype if np.issubdtype(values.dtype, np.floating) else np.dtype(np.float64)
+    states = _AGGREGATOR_STATES[aggregator]
+    return da.reduction(values,
+        partial(_chunk_states, states=states),
+        partial(_finalize_states, aggregator=aggregator, dtype=dtype),
+        axis=axis,
+        keepdims=False,
+        dtype=dtype,
+        combine=partial(_combine_states, states=states),
+        concatenate=False,
+        weights=None if flags is None else da.asarray(flags),
+        meta=np.empty((0,) * (values.ndim - num_axes), dtype=dtype)
+    )
+
+def _aggregate_flag(values, flags, num_axes=1):
+    ''' Reduce last num_axes axes of flags: 0 if any unflagged value, 1 if all values are flagged, else nan. '''
+    axis = tuple(range(values.ndim - num_axes, values.ndim))
+    valid = ~np.isnan(values)
+    num_unflagged = (valid & (flags == 0)).sum(axis=axis)
+    num_valid = valid.sum(axis=axis)
+    return np.where(num_unflagged > 0, 0.0, np.where(num_valid > 0, 1.0, np.nan))
+
+# Reduction functions are called by dask with axis and keepdims
+# pylint: disable=unused-argument, too-many-arguments, too-many-positional-arguments
+def _chunk_states(values, flags=None, axis=None, keepdims=True, states=None, computing_meta=False):
+    ''' Return dict of partial states for values in chunk, reduced along axis with keepdims.
+        With flags, unflagged and flagged values have separate states. '''
+    if computing_meta: # dask array meta
+        return values
+    values = values.astype(np.float64)
+    if flags is None:
+        return {'values': _get_state(values, axis, states)}
+    unflagged = flags == 0
+    return {
+        'unflagged': _get_state(np.where(unflagged, values, np.nan), axis, states),
+        'flagged': _get_state(np.where(unflagged, np.nan, values), axis, states),
+    }
+
+def _combine_states(chunk_states, axis=None, keepdims=True, states=None, computing_meta=False):
+    ''' Return partial states merged from (nested list of) partial states of chunks '''
+    if computing_meta:
+        return chunk_states
+    chunk_states = _flatten(chunk_states)
+    return {key: _merge_states([state[key] for state in chunk_states], states) for key in chunk_states[0]}
+
+def _finalize_states(chunk_states, axis=None, keepdims=False, aggregator=None, dtype=None, computing_meta=False):
+    ''' Return aggregated values from (nested list of) partial states of chunks.
+        Unflagged values are used unless all values are flagged. '''
+    if computing_meta:
+        return chunk_states
+    states = _combine_states(chunk_states, states=_AGGREGATOR_STATES[aggregator])
+    if 'values' in states:
+        agg_values = _get_aggregator_value(states['values'], aggregator)
+    else:
+        agg_values = np.where(states['unflagged']['count'] > 0,
+            _get_aggregator_value(states['unflagged'], aggregator),
+            _get_aggregator_value(states['flagged'], aggregator))
+    if not keepdims:
+        agg_values = np.squeeze(agg_values, axis=axis)
+    return agg_values.astype(dtype)
+# pylint: enable=unused-argument, too-many-arguments, too-many-positional-arguments
+
+def _flatten(chunk_states):
+    ''' Return list of partial states from nested list (by reduced axis) '''
+    if isinstance(chunk_states, list):
+        return [state for states in chunk_states for state in _flatten(states)]
+    return [chunk_states]
+
+def _get_state(values, axis, states):
+    ''' Return partial state of values (float64, nan if not valid) reduced along axis with keepdims '''
+    valid = ~np.isnan(values)
+    state = {'count': valid.sum(axis=axis, keepdims=True)}
+    if 'sum' in states:
+        state['sum'] = np.nansum(values, axis=axis, keepdims=True)
+    if 'min' in states:
+        state['min'] = np.fmin.reduce(values, axis=axis, keepdims=True)
+    if 'max' in states:
+        state['max'] = np.fmax.reduce(values, axis=axis, keepdims=True)
+    if 'mean' in states:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            state['mean'] = np.nansum(values, axis=axis, keepdims=True) / state['count']
+        state['m2'] = np.nansum((values - state['mean']) ** 2, axis=axis, keepdims=True)
+    if 'sketch' in states:
+        # Move reduced axes last and flatten them to one axis of values for each output value
+        state_shape = state['count'].shape
+        values = np.moveaxis(values, axis, tuple(range(-len(axis), 0)))
+        values = values.reshape(values.shape[:values.ndim - len(axis)] + (-1,))
+        sketch_values, sketch_weights = _compress_sketch(values, (~np.isnan(values)).astype(np.float64))
+        state['sketch_values'] = sketch_values.reshape(state_shape + (-1,))
+        state['sketch_weights'] = sketch_weights.reshape(state_shape + (-1,))
+    return state
+
+def _merge_states(states_list, states):
+    ''' Return partial state merged from list of partial states '''
+    state = states_list[0]
+    for other in states_list[1:]:
+        merged = {'count': state['count'] + other['count']}
+        if 'sum' in states:
+            merged['sum'] = state['sum'] + other['sum']
+        if 'min' in states:
+            merged['min'] = np.fmin(state['min'], other['min'])
+        if 'max' in states:
+            merged['max'] = np.fmax(state['max'], other['max'])
+        if 'mean' in states:
+            merged['mean'], merged['m2'] = _merge_moments(state, other, merged['count'])
+        if 'sketch' in states:
+            merged['sketch_values'] = np.concatenate((state['sketch_values'], other['sketch_values']), axis=-1)
+            merged['sketch_weights'] = np.concatenate((state['sketch_weights'], other['sketch_weights']), axis=-1)
+        state = merged
+
+    if 'sketch' in states and len(states_list) > 1:
+        state['sketch_values'], state['sketch_weights'] = _compress_sketch(state['sketch_values'], state['sketch_weights'])
+    return state
+
+def _merge_moments(state, other, count):
+    ''' Return mean and sum of squared differences from mean of two states (Welford/Chan parallel algorithm) '''
+    delta = other['mean'] - state['mean']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = state['mean'] + delta * other['count'] / count
+        m2 = state['m2'] + other['m2'] + delta ** 2 * state['count'] * other['count'] / count
+    mean = np.where(other['count'] == 0, state['mean'], np.where(state['count'] == 0, other['mean'], mean))
+    m2 = np.where(other['count'] == 0, state['m2'], np.where(state['count'] == 0, other['m2'], m2))
+    return mean, m2
+
+def _get_aggregator_value(state, aggregator):
+    ''' Return aggregated values from partial state, nan where no values '''
+    count = state['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if aggregator == 'max':
+            agg_values = state['max']
+        elif aggregator == 'min':
+            agg_values = state['min']
+        elif aggregator == 'sum':
+            agg_values = np.where(count > 0, state['sum'], np.nan)
+        elif aggregator == 'mean':
+            agg_values = state['sum'] / count
+        elif aggregator == 'var':
+            agg_values = state['m2'] / count
+        elif aggregator == 'std':
+            agg_values = np.sqrt(state['m2'] / count)
+        elif aggregator == 'median':
+            agg_values = _get_sketch_quantiles(state['sketch_values'], state['sketch_weights'], np.array([0.5]))[..., 0]
+        else:
+            raise ValueError(f"Invalid aggregator {aggregator}")
+    return agg_values
+
+def _compress_sketch(values, weights):
+    ''' Return values and weights (last axis) sorted by value with empty values (zero weight) last,
+        limited to AGG_SKETCH_SIZE per output value: all values if no more, else equally weighted quantiles.
+        Only columns with values for some output value are kept (at least one), so the sketch of a small reduced
+        axis is no larger than its values; sketches of different sizes are concatenated when merged. '''
+    order = np.argsort(np.where(weights > 0, values, np.inf), axis=-1, kind='stable')
+    values = np.take_along_axis(values, order, axis=-1)
+    weights = np.take_along_axis(weights, order, axis=-1)
+
+    size = AGG_SKETCH_SIZE
+    num_values = max(int(np.count_nonzero(weights, axis=-1).max(initial=0)), 1)
+    if num_values <= size:
+        return values[..., :num_values], weights[..., :num_values]
+
+    keep = (np.count_nonzero(weights, axis=-1) <= size)[..., np.newaxis]
+    quantiles = _get_sketch_quantiles(values, weights, (np.arange(size) + 0.5) / size)
+    quantile_weights = np.broadcast_to(weights.sum(axis=-1, keepdims=True) / size, quantiles.shape)
+    return np.where(keep, values[..., :size], quantiles), np.where(keep, weights[..., :size], quantile_weights)
+
+def _get_sketch_quantiles(values, weights, quantiles):
+    ''' Return quantiles (last axis) of weighted values sorted with empty values last, nan if no values.
+        Each value is at the midpoint of its weight in the cumulative distribution; quantiles between values are
+        interpolated, so quantiles of unit weights are exact (e.g. median of even number of values is mean of middle two). '''
+    shape = values.shape[:-1]
+    num_values = values.shape[-1]
+    values = values.reshape(-1, num_values)
+    weights = weights.reshape(-1, num_values)
+
+    total = weights.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positions = (np.cumsum(weights, axis=-1) - weights / 2) / total
+    positions = np.where(np.isnan(positions), 1.0, positions)
+
+    upper = _search_rows(positions, quantiles)
+    last = np.maximum(np.count_nonzero(weights, axis=-1) - 1, 0)[:, np.newaxis]
+    upper = np.minimum(upper, last)
+    lower = np.minimum(np.maximum(upper - 1, 0), last)
+    lower_position = np.take_along_axis(positions, lower, axis=-1)
+    upper_position = np.take_along_axis(positions, upper, axis=-1)
+    lower_value = np.take_along_axis(values, lower, axis=-1)
+    upper_value = np.take_along_axis(values, upper, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(upper_position > lower_position,
+            np.clip((quantiles - lower_position) / (upper_position - lower_position), 0.0, 1.0), 0.0)
+    return (lower_value + fraction * (upper_value - lower_value)).reshape(shape + (len(quantiles),))
+
+def _search_rows(positions, quantiles):
+    ''' Return index of first position >= each quantile in each row of sorted positions in [0, 1] '''
+    num_rows, num_values = positions.shape
+    # Search all rows at once: offset rows by 2 to keep them sorted
+    offsets = 2.0 * np.arange(num_rows)[:, np.newaxis]
+    indices = np.searchsorted((positions + offsets).ravel(), (quantiles + offsets).ravel()).reshape(num_rows, -1)
+    return indices - num_values * np.arange(num_rows)[:, np.newaxis]
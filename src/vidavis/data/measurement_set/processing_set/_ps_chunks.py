@@ -0,0 +1,182 @@
+'''
+Functions to choose, report, and rewrite the zarr chunk layout of an xradio ProcessingSet for raster plot axes
+'''
+
+import os.path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from casacore import tables
+    _HAVE_CASACORE = True
+except ImportError:
+    _HAVE_CASACORE = False
+
+from vidavis.data.measurement_set.processing_set._xds_data import get_correlated_data
+
+# Target uncompressed size of a main data chunk (xradio default for time chunks)
+PLOT_CHUNK_BYTES = 128 * 2**20
+
+# Main dataset dimensions which can be chunked, and raster plot axes reported by get_chunk_report
+MAIN_DIMS = ['time', 'baseline_id', 'antenna_name', 'frequency', 'polarization']
+COMMON_PLOT_AXES = [('baseline', 'time'), ('frequency', 'time'), ('baseline', 'frequency')]
+PLOT_AXES_OPTIONS = ['time', 'baseline', 'antenna_name', 'frequency', 'polarization']
+
+def check_plot_axes(plot_axes):
+    ''' Raise exception if plot_axes is not (x_axis, y_axis) of main dataset dimensions '''
+    if not isinstance(plot_axes, (list, tuple)) or len(plot_axes) != 2:
+        raise TypeError("Chunk plot axes must be a list or tuple (x_axis, y_axis).")
+    for axis in plot_axes:
+        if axis not in PLOT_AXES_OPTIONS:
+            raise ValueError(f"Invalid chunk plot axis {axis}, options: {PLOT_AXES_OPTIONS}")
+
+def get_plot_chunksize(sizes, plot_axes, itemsize=8):
+    '''
+    Return chunk size by dimension so that a raster plane of the plot axes reads whole chunks of only plotted data.
+    Dimensions which are not plotted have chunk size 1 (selected or aggregated one value at a time).
+    Plotted dimensions are whole, with time chunked so that a chunk is about PLOT_CHUNK_BYTES;
+    the largest plotted dimension is halved while one time step is larger than that.
+        sizes (dict): size of main dataset dimensions.
+        plot_axes (tuple): (x_axis, y_axis) names.
+        itemsize (int): bytes per value of largest data variable.
+    Returns: dict of chunk size for each dimension in sizes which is in MAIN_DIMS.
+    '''
+    plot_dims = _get_plot_dims(plot_axes)
+    chunksize = {dim: int(sizes[dim]) if dim in plot_dims else 1 for dim in sizes if dim in MAIN_DIMS}
+
+    if 'time' in plot_dims and 'time' in chunksize:
+        time_bytes = itemsize * int(np.prod([size for dim, size in chunksize.items() if dim != 'time']))
+        chunksize['time'] = max(1, min(chunksize['time'], PLOT_CHUNK_BYTES // time_bytes))
+
+    while itemsize * int(np.prod(list(chunksize.values()))) > PLOT_CHUNK_BYTES:
+        largest_dim = max(chunksize, key=chunksize.get)
+        if chunksize[largest_dim] == 1:
+            break
+        chunksize[largest_dim] = (chunksize[largest_dim] + 1) // 2
+    return chunksize
+
+def get_msv2_chunksize(ms_path, plot_axes):
+    '''
+    Return main_chunksize for converting MSv2 to MSv4 with chunks for raster plots of plot axes.
+    Sizes are estimated from the MSv2 subtables: all baselines including autocorrelations, maximum number of channels
+    and correlations, and number of rows (upper limit for time).
+    '''
+    if not _HAVE_CASACORE:
+        raise RuntimeError("Cannot read MSv2 for chunk size: python-casacore not installed.")
+
+    with tables.table(ms_path, ack=False) as main_table:
+        num_rows = main_table.nrows()
+    with tables.table(os.path.join(ms_path, 'ANTENNA'), ack=False) as antenna_table:
+        num_antennas = antenna_table.nrows()
+    with tables.table(os.path.join(ms_path, 'SPECTRAL_WINDOW'), ack=False) as spw_table:
+        num_chan = int(np.max(spw_table.getcol('NUM_CHAN')))
+    with tables.table(os.path.join(ms_path, 'POLARIZATION'), ack=False) as pol_table:
+        num_corr = int(np.max(pol_table.getcol('NUM_CORR')))
+
+    sizes = {
+        'time': num_rows,
+        'baseline_id': num_antennas * (num_antennas + 1) // 2,
+        'frequency': num_chan,
+        'polarization': num_corr
+    }
+    chunksize = get_plot_chunksize(sizes, plot_axes)
+    # Single-dish MSv4 has antenna_name dimension instead of baseline_id
+    chunksize['antenna_name'] = min(num_antennas, chunksize['baseline_id'])
+    return chunksize
+
+def get_chunk_report(ps_xdt, data_group='base', plot_axes=None):
+    '''
+    Return pandas DataFrame reporting zarr chunks read for a raster plane of each plot axes in the ProcessingSet.
+    A raster plane selects one value of each dimension which is not plotted, and reads every chunk containing it.
+        ps_xdt (xarray DataTree): ProcessingSet to inspect.
+        data_group (str): data group of correlated data.
+        plot_axes (None, list): list of (x_axis, y_axis). Default None reports COMMON_PLOT_AXES.
+    Returns: DataFrame with row for each plot axes and columns for chunks read, MB read and plotted,
+        and read amplification (bytes read / bytes plotted).
+    '''
+    if plot_axes is None:
+        plot_axes = COMMON_PLOT_AXES
+    for axes in plot_axes:
+        check_plot_axes(axes)
+
+    report = []
+    for axes in plot_axes:
+        plot_dims = _get_plot_dims(axes)
+        chunks_read = read_bytes = plot_bytes = 0
+
+        for ms_xdt in ps_xdt.values():
+            if data_group not in ms_xdt.attrs['data_groups']:
+                continue
+            xda = ms_xdt.ds[get_correlated_data(ms_xdt.ds, data_group)]
+            plane_chunks, plane_read, plane_size = _get_plane_chunks(xda, plot_dims)
+            chunks_read += plane_chunks
+            read_bytes += plane_read * xda.dtype.itemsize
+            plot_bytes += plane_size * xda.dtype.itemsize
+
+        report.append({
+            'x_axis': axes[0],
+            'y_axis': axes[1],
+            'chunks_read': chunks_read,
+            'read_mb': read_bytes / 2**20,
+            'plot_mb': plot_bytes / 2**20,
+            'read_amplification': read_bytes / plot_bytes if plot_bytes else np.nan
+        })
+    return pd.DataFrame(report)
+
+def _get_plane_chunks(xda, plot_dims):
+    ''' Return number of chunks, values read, and values plotted for a raster plane of plot_dims in xda '''
+    plane_chunks = plane_read = plane_size = 1
+    for dim, chunk in _get_dim_chunks(xda).items():
+        if dim in plot_dims:
+            plane_chunks *= -(-xda.sizes[dim] // chunk) # ceil
+            plane_read *= xda.sizes[dim]
+            plane_size *= xda.sizes[dim]
+        else:
+            plane_read *= chunk
+    return plane_chunks, plane_read, plane_size
+
+def rechunk_ps(ps_xdt, out_path, plot_axes, logger):
+    '''
+    Write copy of ProcessingSet to zarr with main datasets chunked for raster plots of plot axes.
+    Subdatasets (antenna, field and source, etc.) are copied unchanged.
+        ps_xdt (xarray DataTree): ProcessingSet to copy.
+        out_path (str): path of output zarr file, which must not exist.
+        plot_axes (tuple): (x_axis, y_axis) names.
+        logger (graphviper logger): logger
+    '''
+    check_plot_axes(plot_axes)
+    if os.path.exists(out_path):
+        raise RuntimeError(f"Rechunked zarr file {out_path} already exists")
+
+    rechunked_ps_xdt = ps_xdt.copy()
+    for name, ms_xdt in rechunked_ps_xdt.items():
+        xds = ms_xdt.to_dataset()
+        itemsize = max(xds[var].dtype.itemsize for var in xds.data_vars if 'time' in xds[var].dims)
+        chunksize = get_plot_chunksize(xds.sizes, plot_axes, itemsize)
+        logger.debug(f"Rechunking {name} with chunks {chunksize}")
+
+        xds = xds.chunk(chunksize)
+        for variable in xds.variables.values():
+            # Use dask chunks, not chunks read from input zarr
+            for key in ['chunks', 'preferred_chunks', 'shards']:
+                variable.encoding.pop(key, None)
+        ms_xdt.dataset = xds
+
+    logger.info(f"Writing ProcessingSet chunked for {plot_axes[0]} vs. {plot_axes[1]} raster plots to {out_path}")
+    rechunked_ps_xdt.to_zarr(out_path)
+
+def _get_plot_dims(plot_axes):
+    ''' Return main dataset dimensions for plot axes. Baseline axis is antenna_name for single dish data. '''
+    plot_dims = []
+    for axis in plot_axes:
+        plot_dims.extend(['baseline_id', 'antenna_name'] if axis in ['baseline', 'antenna_name'] else [axis])
+    return plot_dims
+
+def _get_dim_chunks(xda):
+    ''' Return first chunk size by dimension of data array in zarr, else dask, else whole dimension. '''
+    if 'chunks' in xda.encoding:
+        return dict(zip(xda.dims, xda.encoding['chunks']))
+    if xda.chunks:
+        return {dim: chunks[0] for dim, chunks in zip(xda.dims, xda.chunks)}
+    return dict(xda.sizes)
@@ -2,12 +2,14 @@
 Concat ProcessingSet xarray DataSets into single xds by time dimension (in order)
 '''
 
+import numpy as np
 import xarray as xr
 
 from vidavis.data.measurement_set.processing_set._ps_coords import set_coordinates
 
-def concat_ps_xdt(ps_xdt, logger):
+def concat_ps_xdt(ps_xdt, logger, xds_function=None):
     ''' Concatenate xarray Datasets in ProcessingSet by time dimension.
+        Optionally apply xds_function(xds) to each Dataset before concat; must not reduce time dimension.
         Return concat xds. '''
     if len(ps_xdt) == 0:
         raise RuntimeError("Processing set empty after selection.")
@@ -16,6 +18,8 @@ def concat_ps_xdt(ps_xdt, logger):
     for name, ms_xdt in ps_xdt.items():
         # Set units to str not list and set baseline coordinate.  Returns xarray.Dataset
         ps[name] = set_coordinates(ms_xdt)
+        if xds_function:
+            ps[name] = xds_function(ps[name])
 
     if len(ps) == 1:
         logger.debug("Processing set contains one dataset, nothing to concat.")
@@ -33,66 +37,39 @@ def concat_ps_xdt(ps_xdt, logger):
     if len(xds_list) > len(ps_xdt):
         logger.debug(f"Split {len(ps_xdt)} datasets by time gap into {len(xds_list)} datasets for concat.")
 
-    # Create sorted xds list using sorted times
-    time_list.sort()
-    sorted_xds = [None] * len(time_list)
-
-    for xds in xds_list:
-        try:
-            first_xds_time = xds.time.values[0]
-        except IndexError: # one value selected
-            first_xds_time = xds.time.values
-
-        for idx, value in enumerate(time_list):
-            if value == first_xds_time and sorted_xds[idx] is None:
-                if "baseline" in xds.coords:
-                    # Cannot concat with non-dim string coord
-                    xds = xds.drop("baseline_antenna1_name")
-                    xds = xds.drop("baseline_antenna2_name")
-                # Convert MeasurementSetXds to xr Dataset for concat
-                # (TypeError: MeasurementSetXds.__init__() got an unexpected keyword argument 'coords')
-                sorted_xds[idx] = xr.Dataset(xds.data_vars, xds.coords, xds.attrs)
-                break
+    # Create xds list sorted by first time; stable sort keeps xds order for equal times
+    first_times = np.array(time_list)
+    sorted_xds = [_get_concat_xds(xds_list[idx]) for idx in np.argsort(first_times, kind='stable')]
     return xr.concat(sorted_xds, dim='time', join='outer')
 
+def _get_concat_xds(xds):
+    ''' Return xr Dataset which can be concatenated by time '''
+    if "baseline" in xds.coords:
+        # Cannot concat with non-dim string coord
+        xds = xds.drop("baseline_antenna1_name")
+        xds = xds.drop("baseline_antenna2_name")
+    # Convert MeasurementSetXds to xr Dataset for concat
+    # (TypeError: MeasurementSetXds.__init__() got an unexpected keyword argument 'coords')
+    return xr.Dataset(xds.data_vars, xds.coords, xds.attrs)
+
 def _get_sorted_times(ps):
-    values = []
-    for key in ps:
-        time_values = ps[key].time.values
-        if time_values.size > 1:
-            values.extend(time_values.tolist())
-        else:
-            values.append(time_values)
-    return sorted(values)
+    ''' Return sorted numpy array of times in all xds (including duplicates) '''
+    return np.sort(np.concatenate([xds.time.values.ravel() for xds in ps.values()]))
 
 def _split_xds_by_time_gap(xds, sorted_times):
-    ''' Split xds where there is a gap in sorted times.
+    ''' Split xds where there is a gap in sorted times, i.e. where the next sorted time after an xds time
+        (first occurrence) is not the next xds time.  Assumes xds times are increasing.
         Return list of xds and first time in each one. '''
     times = xds.time.values.ravel()
-    xds_list = []
-    first_times = [times[0]]
-
     if len(times) == 1:
-        xds_list.append(xds)
-    else:
-        sorted_time_idx = sorted_times.index(times[0])
-        idx = xds_start_idx = 0 # start for iselection
-
-        for idx, time in enumerate(times):
-            if time == sorted_times[sorted_time_idx]:
-                # No time gap, go to next time
-                sorted_time_idx += 1
-                continue
-
-            # Found time gap, select xds
-            xds_list.append(xds.isel(time=slice(xds_start_idx, idx)))
-
-            # start next xds with new first time, find idx in sorted times (skip ahead)
-            xds_start_idx = idx
-            first_times.append(times[idx])
-            sorted_time_idx = sorted_times.index(time) + 1 # for next time
+        return [xds], [times[0]]
 
-        # add last time range xds
-        xds_list.append(xds.isel(time=slice(xds_start_idx, idx + 1)))
+    # Index of next sorted time after each time (except last)
+    next_sorted_idx = np.searchsorted(sorted_times, times[:-1], side='left') + 1
+    next_sorted_idx = np.minimum(next_sorted_idx, sorted_times.size - 1)
+    gap_idx = np.nonzero(sorted_times[next_sorted_idx] != times[1:])[0] + 1
 
-    return xds_list, first_times
+    start_idx = np.concatenate(([0], gap_idx))
+    end_idx = np.concatenate((gap_idx, [len(times)]))
+    xds_list = [xds.isel(time=slice(start, end)) for start, end in zip(start_idx, end_idx)]
+    return xds_list, list(times[start_idx])
@@ -0,0 +1,75 @@
+'''
+Convert MSv2 to xradio ProcessingSet zarr in parallel by partition with the xradio public API.
+Conversion state is saved in a sidecar file next to the zarr store, so an incomplete zarr store (e.g. interrupted
+conversion) is not opened and is converted again.
+'''
+
+import json
+import os
+import time
+
+import zarr
+
+try:
+    # requires python-casacore
+    from xradio.measurement_set.convert_msv2_to_processing_set import convert_msv2_to_processing_set
+    _HAVE_CASACORE = True
+except ImportError:
+    _HAVE_CASACORE = False
+
+CONVERT_STATE_EXT = ".convert.json"
+
+def is_conversion_complete(zarr_path):
+    ''' Return whether zarr store was completely written: conversion state is complete if converted by vidavis,
+        else xradio ProcessingSet type is set in root attributes (written last by xradio conversion). '''
+    state = _read_state(zarr_path)
+    if state is not None:
+        return state.get('complete', False)
+    try:
+        return zarr.open(zarr_path, mode='r').attrs.get('type') == 'processing_set'
+    except (OSError, ValueError, KeyError, zarr.errors.BaseZarrError):
+        return False
+
+def convert_msv2(ms_path, zarr_path, logger, main_chunksize=None):
+    '''
+    Convert MSv2 to ProcessingSet zarr with xradio default partitioning, converting partitions in parallel.
+    An existing incomplete zarr store is overwritten.
+        ms_path (str): path to MSv2
+        zarr_path (str): path to output zarr store
+        logger (graphviper logger): logger
+        main_chunksize (None, dict): xradio main_chunksize, or None for xradio default chunks
+    '''
+    if not _HAVE_CASACORE:
+        raise RuntimeError("Cannot convert MSv2 to xradio zarr file: python-casacore not installed.")
+
+    if os.path.exists(zarr_path):
+        logger.warning(f"Restarting incomplete conversion to {zarr_path}")
+    state = {'inputs': {'ms': os.path.abspath(ms_path), 'main_chunksize': main_chunksize}, 'complete': False}
+    _write_state(zarr_path, state)
+
+    start = time.time()
+    convert_msv2_to_processing_set(
+        in_file=ms_path,
+        out_file=zarr_path,
+        main_chunksize=main_chunksize,
+        parallel_mode='partition',
+        persistence_mode='w' # overwrite incomplete store
+    )
+    state['complete'] = True
+    _write_state(zarr_path, state)
+    logger.info(f"Converted {ms_path} to {zarr_path} in {time.time() - start:.1f} s")
+
+def _read_state(zarr_path):
+    ''' Return conversion state dict from sidecar file, or None if not converted by vidavis or unreadable '''
+    try:
+        with open(os.path.abspath(zarr_path) + CONVERT_STATE_EXT, 'r', encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return None
+
+def _write_state(zarr_path, state):
+    ''' Write conversion state to sidecar file; replace whole file so interrupted write keeps previous state '''
+    state_path = os.path.abspath(zarr_path) + CONVERT_STATE_EXT
+    with open(state_path + ".tmp", 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(state_path + ".tmp", state_path)
@@ -6,35 +6,46 @@ import numpy as np
 import pandas as pd
 
 try:
-    from vidavis.data.measurement_set.processing_set._ps_io import get_processing_set
+    from vidavis.data.measurement_set.processing_set._ps_store import get_ps_store
     _HAVE_XRADIO = True
+    from vidavis.data.measurement_set.processing_set._ps_chunks import get_chunk_report, rechunk_ps
     from vidavis.plot.ms_plot._ms_plot_constants import TIME_FORMAT
     from vidavis.data.measurement_set.processing_set._ps_select import select_ps, select_ms
-    from vidavis.data.measurement_set.processing_set._ps_stats import calculate_ps_stats
-    from vidavis.data.measurement_set.processing_set._ps_raster_data import raster_data
+    from vidavis.data.measurement_set.processing_set._ps_selection_cache import get_selection_key, is_selection_applied
+    from vidavis.data.measurement_set.processing_set._ps_stats import calculate_ps_stats, calculate_ps_quantiles, get_quantiles_seed
+    from vidavis.data.measurement_set.processing_set._ps_raster_data import raster_data, get_raster_data_inputs, set_raster_selection
     from vidavis.data.measurement_set.processing_set._xds_data import get_correlated_data
 except ImportError as e:
     _HAVE_XRADIO = False
 
 
+#pylint: disable=too-many-public-methods
 class PsData:
     '''
     Class implementing data backend using xradio Processing Set for accessing and selecting MeasurementSet data.
     '''
 
-    def __init__(self, ms, logger):
+    def __init__(self, ms, logger, chunk_axes=None):
         if not _HAVE_XRADIO:
             raise RuntimeError("xradio package not available for reading MeasurementSet")
 
         if not ms:
             raise RuntimeError("MS path not available for reading MeasurementSet")
 
-        # Open processing set from zarr. Converts msv2 if ms path is not zarr
-        self._ps_xdt, self._zarr_path = get_processing_set(ms, logger)
+        # Open processing set from zarr, or share store opened in this process. Converts msv2 if ms path is not zarr
+        self._store = get_ps_store(ms, logger, chunk_axes)
+        self._ps_xdt = self._store.get_ps_xdt()
+        self._zarr_path = self._store.get_zarr_path()
 
         self._logger = logger
         self._selection = {}
         self._selected_ps_xdt = None # cumulative selection
+        self._selection_key = () # selections applied to ps_xdt for selected ps_xdt
+        self._selection_cache = self._store.get_selection_cache() # (selected ps_xdt, dimension values) by selection key
+        self._dimension_values = self._store.get_dimension_values() # unique values by dimension for selected ps_xdt
+        self._stats_cache = self._store.get_stats_cache()
+        self._raster_selection_cache = self._store.get_raster_selection_cache() # raster plane ps_xdt by selection key
+        self._raster_cache = self._store.get_raster_cache() # (raster xds, raster selection) by raster data key
 
     def get_path(self):
         ''' Return path to zarr file (input or converted from msv2) '''
@@ -82,7 +93,7 @@ class PsData:
 
     def get_summary(self, data_group='base'):
         ''' Return summary of original ps '''
-        return self._ps_xdt.xr_ps.summary(data_group)
+        return self._store.get_summary(data_group)
 
     def get_data_groups(self):
         ''' Returns dict of data groups in Processing Set data. '''
@@ -126,57 +137,60 @@ class PsData:
         ''' Return sorted list of unique values for input dimension in selected ProcessingSet.
             For 'time', returns datetime strings.
             For spectrum datasets, 'antenna2' returns empty list.
+            Values are saved until the selection changes.
         '''
-        ps_xdt = self._get_ps_xdt()
-        dim_values = []
-
-        if dimension == 'time':
-            dim_values = self._get_time_strings(ps_xdt)
-        elif dimension == 'baseline':
-            dim_values = self._get_baselines(ps_xdt)
-        else:
-            if dimension == 'antenna1':
-                dimension = 'baseline_antenna1_name'
-            elif dimension == 'antenna2':
-                dimension = 'baseline_antenna2_name'
-            for ms_xdt in ps_xdt.values():
-                if dimension not in ms_xdt.coords:
-                    if 'antenna1' in dimension and 'antenna_name' in ms_xdt.coords:
-                        dimension = 'antenna_name' # spectrum dataset
-                    else:
-                        continue
-                try:
-                    dim_values.extend([value.item() for value in ms_xdt[dimension].values])
-                except TypeError:
-                    dim_values.append(ms_xdt[dimension].values.item())
-
-        if not dim_values:
-            return dim_values
-        return sorted(set(dim_values))
+        if dimension not in self._dimension_values:
+            ps_xdt = self._get_ps_xdt()
+            if dimension == 'time':
+                dim_values = self._get_time_strings(ps_xdt)
+            elif dimension == 'baseline':
+                dim_values = self._get_baselines(ps_xdt)
+            else:
+                dim_values = self._get_coord_values(ps_xdt, dimension)
+            self._dimension_values[dimension] = np.unique(dim_values).tolist() if dim_values.size > 0 else []
+        return list(self._dimension_values[dimension])
 
     def _get_time_strings(self, ps):
-        ''' Return time values as string not float '''
+        ''' Return unique time values as string not float '''
         times = []
         for ms_xdt in ps.values():
             time_xda = ms_xdt.time
             time_attrs = time_xda.attrs
-            date_strings = pd.to_datetime(time_xda, unit=time_attrs['units'][0], origin=time_attrs['format']).strftime(TIME_FORMAT).values
-            times.extend(date_strings.tolist())
-        return times
+            unique_times = np.unique(time_xda.values)
+            date_strings = pd.to_datetime(unique_times, unit=time_attrs['units'][0], origin=time_attrs['format']).strftime(TIME_FORMAT).values
+            times.append(date_strings.astype(str))
+        return np.concatenate(times) if times else np.array([])
 
     def _get_baselines(self, ps):
         ''' Return baseline strings as ant1_name & ant2_name.
-            For spectrum datasets, return list of antenna_name. '''
+            For spectrum datasets, return antenna_name. '''
         baselines = []
         for ms_xdt in ps.values():
             if 'antenna_name' in ms_xdt.coords:
-                baselines.extend(ms_xdt.antenna_name.values)
+                baselines.append(ms_xdt.antenna_name.values.astype(str))
             else:
-                ant1_names = ms_xdt.baseline_antenna1_name.values
-                ant2_names = ms_xdt.baseline_antenna2_name.values
-                for ant1, ant2 in zip(ant1_names, ant2_names):
-                    baselines.append(f"{ant1} & {ant2}")
-        return baselines
+                ant1_names = ms_xdt.baseline_antenna1_name.values.astype(str)
+                ant2_names = ms_xdt.baseline_antenna2_name.values.astype(str)
+                baselines.append(np.char.add(np.char.add(ant1_names, " & "), ant2_names))
+        return np.concatenate(baselines) if baselines else np.array([])
+
+    def _get_coord_values(self, ps, dimension):
+        ''' Return values of dimension coordinate in all ms_xdt.
+            For spectrum datasets, 'antenna1' returns antenna_name. '''
+        if dimension == 'antenna1':
+            dimension = 'baseline_antenna1_name'
+        elif dimension == 'antenna2':
+            dimension = 'baseline_antenna2_name'
+
+        values = []
+        for ms_xdt in ps.values():
+            if dimension not in ms_xdt.coords:
+                if 'antenna1' in dimension and 'antenna_name' in ms_xdt.coords:
+                    dimension = 'antenna_name' # spectrum dataset
+                else:
+                    continue
+            values.append(ms_xdt[dimension].values.ravel())
+        return np.concatenate(values) if values else np.array([])
 
     def get_dimension_attrs(self, dim):
         ''' Return attributes dict for input dimension in ProcessingSet. '''
@@ -193,36 +207,93 @@ class PsData:
             https://xradio.readthedocs.io/en/latest/measurement_set/schema_and_api/measurement_set_api.html#xradio.measurement_set.ProcessingSetXdt.query
             Also applies selection to ms_xdt in ps.
             Selections are cumulative until clear_selection() is called.
-            Saves selected ProcessingSet internally.
+            Saves selected ProcessingSet internally, and reuses a recent identical selection.
             Throws exception if selection fails.
         '''
-        ps_xdt = self._get_ps_xdt()
-        self._selected_ps_xdt = select_ps(ps_xdt, self._logger, query=query, string_exact_match=string_exact_match, **kwargs)
+        key = self._selection_key + (get_selection_key('select_ps', query=query, string_exact_match=string_exact_match, **kwargs),)
+        self._set_selection(key,
+            lambda ps_xdt: select_ps(ps_xdt, self._logger, query=query, string_exact_match=string_exact_match, **kwargs))
 
     def select_ms(self, indexers=None, method=None, tolerance=None, drop=False, **indexers_kwargs):
         ''' Apply dimension and data group selection to MeasurementSet. See MeasurementsSetXdt sel().
             https://xradio.readthedocs.io/en/latest/measurement_set/schema_and_api/measurement_set_api.html#xradio.measurement_set.MeasurementSetXdt.sel.
             Additional supported selection besides dimensions include "baseline", "antenna1", "antenna2".
             Selections are cumulative until clear_selection() is called.
-            Saves selected ProcessingSet internally.
+            Saves selected ProcessingSet internally, and reuses a recent identical selection.
             Throws exception if selection fails.
         '''
-        ps_xdt = self._get_ps_xdt()
-        self._selected_ps_xdt = select_ms(ps_xdt, self._logger, indexers, method, tolerance, drop, **indexers_kwargs)
+        key = self._selection_key + (get_selection_key('select_ms', indexers=indexers, method=method, tolerance=tolerance,
+            drop=drop, **indexers_kwargs),)
+        self._set_selection(key,
+            lambda ps_xdt: select_ms(ps_xdt, self._logger, indexers, method, tolerance, drop, **indexers_kwargs))
 
     def clear_selection(self):
         ''' Clear previous selections and use original ps_xdt '''
         self._selected_ps_xdt = None
+        self._selection_key = ()
+        self._dimension_values = self._store.get_dimension_values()
+
+    def _set_selection(self, key, select_function):
+        ''' Set selected ps_xdt for selection key from cache, else apply select_function to current ps_xdt and cache it.
+            A selection already applied (e.g. automatic spw selection for each plot) is not added to the key. '''
+        if is_selection_applied(self._selection_key, key[-1]):
+            self._logger.debug(f"Selection {key[-1]} already applied")
+            return
+
+        cached_selection = self._selection_cache.get(key)
+        if cached_selection is None:
+            cached_selection = (select_function(self._get_ps_xdt()), {})
+            self._selection_cache.set(key, cached_selection)
+        else:
+            self._logger.debug(f"Using cached selection {key[-1]}")
+        self._selected_ps_xdt, self._dimension_values = cached_selection
+        self._selection_key = key
 
     def get_vis_stats(self, ps_selection, vis_axis):
         ''' Returns statistics (min, max, mean, std) for data in data group selected by selection.
+            Stats are read from the persistent stats cache if the zarr store has not changed.
                 data_group (str): correlated data to use for calculations
                 selection (dict): fields and values to select
                 vis_axis (str): complex component to apply to data
         '''
+        stats = self._stats_cache.get_stats(ps_selection, vis_axis)
+        if stats is not None:
+            return stats
+
+        stats_ps_xdt = select_ps(self._ps_xdt, self._logger, query=None, string_exact_match=True, **ps_selection)
+        data_group = ps_selection['data_group_name'] if 'data_group_name' in ps_selection else 'base'
+        stats = calculate_ps_stats(stats_ps_xdt, self._zarr_path, vis_axis, data_group, self._logger)
+        self._stats_cache.set_stats(ps_selection, vis_axis, stats)
+        return stats
+
+    def get_vis_quantiles(self, ps_selection, vis_axis, quantiles, sample_fraction):
+        ''' Returns estimated quantiles for data in data group selected by selection, using a sample of data chunks.
+            Quantiles are read from the persistent stats cache if the zarr store has not changed.
+                selection (dict): fields and values to select
+                vis_axis (str): complex component to apply to data
+                quantiles (tuple): quantile fractions (0-1) to estimate
+                sample_fraction (float): fraction of time chunks to read
+        '''
+        cache_selection = ps_selection | {'quantiles': quantiles, 'sample_fraction': sample_fraction}
+        values = self._stats_cache.get_stats(cache_selection, vis_axis)
+        if values is not None:
+            return values
+
         stats_ps_xdt = select_ps(self._ps_xdt, self._logger, query=None, string_exact_match=True, **ps_selection)
         data_group = ps_selection['data_group_name'] if 'data_group_name' in ps_selection else 'base'
-        return calculate_ps_stats(stats_ps_xdt, self._zarr_path, vis_axis, data_group, self._logger)
+        seed = get_quantiles_seed(self._zarr_path, cache_selection, vis_axis)
+        values = calculate_ps_quantiles(stats_ps_xdt, vis_axis, data_group, quantiles, sample_fraction, seed,
+            self._logger)
+        self._stats_cache.set_stats(cache_selection, vis_axis, values)
+        return values
+
+    def get_chunk_report(self, data_group='base', plot_axes=None):
+        ''' Returns pandas DataFrame reporting zarr chunk reads for raster plots of plot axes in original ProcessingSet. '''
+        return get_chunk_report(self._ps_xdt, data_group, plot_axes)
+
+    def rechunk(self, out_path, plot_axes):
+        ''' Write copy of original ProcessingSet to zarr out_path with chunks for raster plots of plot axes. '''
+        rechunk_ps(self._ps_xdt, out_path, plot_axes, self._logger)
 
     def get_correlated_data(self, data_group):
         ''' Returns name of 'correlated_data' in Processing Set data_group '''
@@ -233,11 +304,36 @@ class PsData:
         raise RuntimeError(f"No correlated data for data group {data_group}")
 
     def get_raster_data(self, plot_inputs):
-        ''' Returns xarray Dataset after applying plot inputs and raster plane selection '''
-        return raster_data(self._get_ps_xdt(),
+        ''' Returns xarray Dataset after applying plot inputs and raster plane selection.
+            Raster data is cached by selection and data inputs, so plots with new style inputs reuse it. '''
+        key = self._selection_key + (get_selection_key('raster_data', **get_raster_data_inputs(plot_inputs)),)
+        cached_raster = self._raster_cache.get(key)
+        if cached_raster is not None:
+            raster_xds, dim_selection = cached_raster
+            set_raster_selection(plot_inputs, dim_selection)
+            self._logger.debug("Using cached raster data")
+            return raster_xds
+
+        raster_xds = raster_data(self._get_ps_xdt(),
             plot_inputs,
-            self._logger
+            self._logger,
+            self._get_raster_select_function()
         )
+        self._raster_cache.set(key, raster_xds, plot_inputs.get('dim_selection'))
+        return raster_xds
+
+    def _get_raster_select_function(self):
+        ''' Return function to select raster plane in selected ps_xdt, using raster selection cache.
+            Raster selections are kept separate from user selections since plotting modifies their coordinates. '''
+        selection_key = self._selection_key
+        def select_raster_ms(ps_xdt, **selection):
+            key = selection_key + (get_selection_key('raster_select_ms', **selection),)
+            selected_ps_xdt = self._raster_selection_cache.get(key)
+            if selected_ps_xdt is None:
+                selected_ps_xdt = select_ms(ps_xdt, self._logger, indexers=None, method=None, tolerance=None, **selection)
+                self._raster_selection_cache.set(key, selected_ps_xdt)
+            return selected_ps_xdt
+        return select_raster_ms
 
     def _get_ps_xdt(self):
         ''' Returns selected ps_xdt if selection has been done, else original ps_xdt '''
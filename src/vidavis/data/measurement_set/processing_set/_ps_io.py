@@ -6,19 +6,17 @@ import os.path
 
 from xradio.measurement_set.open_processing_set import open_processing_set
 
-try:
-    # requires python-casacore
-    from xradio.measurement_set.convert_msv2_to_processing_set import convert_msv2_to_processing_set
-    __HAVE_CASACORE = True
-except ImportError:
-    __HAVE_CASACORE = False
-
-def get_processing_set(ms_path, logger):
+from vidavis.data.measurement_set.processing_set._ps_chunks import check_plot_axes, get_msv2_chunksize
+from vidavis.data.measurement_set.processing_set._ps_convert import convert_msv2, is_conversion_complete
+
+def get_processing_set(ms_path, logger, chunk_axes=None):
     '''
     Read msv2 or zarr file into processing set
 
     Args:
         ms_path (str): path to MSv2 or MSv4 zarr file
+        chunk_axes (None, tuple): (x_axis, y_axis) of raster plots to chunk zarr data for when converting MSv2.
+            Default None uses xradio default chunks.
     Returns:
         xradio ProcessingSet
     '''
@@ -35,18 +33,22 @@ def get_processing_set(ms_path, logger):
         zarr_path = ms_path
     else:
         zarr_path = basename + ".ps.zarr"
-        if not os.path.exists(zarr_path):
-            if not __HAVE_CASACORE:
-                raise RuntimeError("Cannot convert MSv2 to xradio zarr file: python-casacore not installed.")
+        if not os.path.exists(zarr_path) or not is_conversion_complete(zarr_path):
+            # Convert, or restart interrupted conversion
+            main_chunksize = None
+            if chunk_axes:
+                check_plot_axes(chunk_axes)
+                main_chunksize = get_msv2_chunksize(ms_path, chunk_axes)
+                logger.info(f"Chunking zarr for {chunk_axes[0]} vs. {chunk_axes[1]} raster plots: {main_chunksize}")
             logger.info(f"Converting input MS {ms_path} to zarr {zarr_path}")
-            convert_msv2_to_processing_set(
-                in_file=ms_path,
-                out_file=zarr_path
-                )
+            convert_msv2(ms_path, zarr_path, logger, main_chunksize)
 
     if not os.path.exists(zarr_path):
         raise RuntimeError("Zarr file does not exist")
 
+    if not is_conversion_complete(zarr_path):
+        raise RuntimeError(f"Zarr file {zarr_path} is incomplete: open the MSv2 to convert it again")
+
     ps = open_processing_set(zarr_path)
     if not ps or len(ps) == 0:
         raise RuntimeError("Failed to read measurement set into processing set.")
@@ -0,0 +1,53 @@
+'''
+In-memory LRU cache of computed raster planes, bounded by memory size.
+'''
+
+from collections import OrderedDict
+import threading
+
+RASTER_CACHE_BYTES = 512 * 1024**2
+
+class PsRasterCache:
+    '''
+    Cache computed raster plane Datasets (reduced visibilities, flags, and coordinates) by raster data key,
+    so plots which change only styling (colormaps, colorbars, color range, title) skip all data I/O and reduction.
+    Least recently used planes are removed when the total size of cached planes exceeds max_bytes;
+    a plane larger than max_bytes is not cached. Cached planes are shared and must not be modified.
+    '''
+
+    def __init__(self, max_bytes=RASTER_CACHE_BYTES):
+        self._max_bytes = max_bytes
+        self._nbytes = 0
+        self._cache = OrderedDict() # (raster xds, raster selection, nbytes) by key
+        self._lock = threading.Lock() # iteration plots compute concurrently
+
+    def get(self, key):
+        ''' Return cached (raster xds, raster selection) for key, or None if not cached. '''
+        with self._lock:
+            cached_raster = self._cache.get(key)
+            if cached_raster is None:
+                return None
+            self._cache.move_to_end(key)
+        raster_xds, raster_selection, _ = cached_raster
+        return raster_xds, raster_selection
+
+    def set(self, key, raster_xds, raster_selection):
+        ''' Add raster xds and the raster plane selection applied to create it, removing least recently used planes
+            until cache size is within limit. '''
+        nbytes = raster_xds.nbytes
+        if nbytes > self._max_bytes:
+            return
+
+        with self._lock:
+            if key in self._cache:
+                self._nbytes -= self._cache.pop(key)[2]
+            self._cache[key] = (raster_xds, raster_selection, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self._max_bytes:
+                self._nbytes -= self._cache.popitem(last=False)[1][2]
+
+    def clear(self):
+        ''' Remove all cached planes '''
+        with self._lock:
+            self._cache.clear()
+            self._nbytes = 0
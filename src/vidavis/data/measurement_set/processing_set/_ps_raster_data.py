@@ -2,50 +2,101 @@
 Functions to create a raster xarray Dataset from xradio ProcessingSet after applying plot inputs
 '''
 
+from functools import partial
+
 import numpy as np
 
 from xradio.measurement_set._utils._utils.stokes_types import stokes_types
 
+from vidavis.data.measurement_set.processing_set._ps_aggregate import aggregate_xda, aggregate_flagged_xda
 from vidavis.data.measurement_set.processing_set._ps_concat import concat_ps_xdt
 from vidavis.data.measurement_set.processing_set._ps_coords import set_datetime_coordinate
 from vidavis.data.measurement_set.processing_set._ps_select import select_ms
 from vidavis.data.measurement_set.processing_set._xds_data import get_correlated_data, get_axis_data
 
-def raster_data(ps_xdt, plot_inputs, logger):
+# Plot inputs which determine raster data; other inputs only style the plot
+RASTER_DATA_INPUTS = ['x_axis', 'y_axis', 'vis_axis', 'aggregator', 'agg_axis', 'data_group', 'data_dims', 'iter_axis',
+    'selection', 'locate_data']
+
+# Data group variables; other data groups are not included in raster data
+DATA_GROUP_VARS = ['correlated_data', 'flag', 'weight', 'uvw']
+
+def raster_data(ps_xdt, plot_inputs, logger, select_function=None):
     '''
     Create raster xds: y_axis vs x_axis for vis axis.
         ps_xdt (xarray DataTree): input datasets.
         plot_inputs (dict): user inputs for plot
         logger (graphviper logger): logger
+        select_function (None, callable): select_function(ps_xdt, **selection) to select raster plane dimensions,
+            e.g. with cache. Default None uses select_ms.
     Returns: selected xarray Dataset of visibility component and updated selection
     '''
-    raster_xdt = _select_raster_dimensions(ps_xdt, plot_inputs, logger)
+    if select_function is None:
+        select_function = partial(_select_ms, logger=logger)
+    raster_xdt = _select_raster_dimensions(ps_xdt, plot_inputs, logger, select_function)
 
-    # Create xds from concat ms_xds in ps
-    raster_xds = concat_ps_xdt(raster_xdt, logger)
+    # Project data variables needed for plot (and locate), compute complex component of vis data and apply aggregator
+    # lazily for each ms_xds, unless time is aggregated
+    # (time is concat dimension). Only the reduced raster plane is computed below.
+    agg_before_concat = not (plot_inputs['aggregator'] and plot_inputs['agg_axis'] and 'time' in plot_inputs['agg_axis'])
+    raster_xds = concat_ps_xdt(raster_xdt, logger,
+        lambda xds: _get_vis_axis_xds(xds, plot_inputs, logger, agg_before_concat))
+
+    if not agg_before_concat:
+        raster_xds = aggregate_data(raster_xds, plot_inputs, logger)
+
+    # Convert float time to datetime
+    set_datetime_coordinate(raster_xds)
+
+    # Compute reduced raster plane
+    raster_xds = raster_xds.compute()
 
     data_group = plot_inputs['data_group']
     correlated_data = get_correlated_data(raster_xds, data_group)
     if raster_xds[correlated_data].count() == 0:
         raise RuntimeError("Plot failed: raster plane selection yielded data with all nan values.")
 
-    # Compute complex component of vis data
-    raster_xds[correlated_data] = get_axis_data(raster_xds, plot_inputs['vis_axis'], data_group)
+    logger.debug(f"Plotting visibility data with shape: {dict(raster_xds[correlated_data].sizes)}")
+    return raster_xds
 
-    # Convert float time to datetime
-    set_datetime_coordinate(raster_xds)
+def get_raster_data_inputs(plot_inputs):
+    ''' Return dict of plot inputs which determine raster data, e.g. for cache key '''
+    return {name: plot_inputs.get(name) for name in RASTER_DATA_INPUTS}
 
-    # Apply aggregator
-    raster_xds = aggregate_data(raster_xds, plot_inputs, logger)
+def set_raster_selection(plot_inputs, dim_selection):
+    ''' Update plot inputs with raster plane selection as done by raster_data, for cached raster data. '''
+    if dim_selection:
+        if 'iter_axis' in plot_inputs and plot_inputs['iter_axis']:
+            plot_inputs['selection'].pop(plot_inputs['iter_axis'])
+        plot_inputs['dim_selection'] = dim_selection
 
-    logger.debug(f"Plotting visibility data with shape: {dict(raster_xds[correlated_data].sizes)}")
-    return raster_xds
+def _get_vis_axis_xds(xds, plot_inputs, logger, aggregate):
+    ''' Return xds with complex component of correlated data, aggregated if requested. Computation is lazy. '''
+    data_group = plot_inputs['data_group']
+    xds = _project_data_vars(xds, data_group, plot_inputs.get('locate_data', True))
+    correlated_data = get_correlated_data(xds, data_group)
+    xds[correlated_data] = get_axis_data(xds, plot_inputs['vis_axis'], data_group)
+    if aggregate:
+        xds = aggregate_data(xds, plot_inputs, logger)
+    return xds
+
+def _project_data_vars(xds, data_group, locate):
+    ''' Return xds with only the data variables needed for raster plot, so others are not read or aggregated:
+        correlated data and flag of data group, plus its weight and uvw and variables not in any data group (except
+        TIME_CENTROID) to locate points. '''
+    group_info = xds.attrs['data_groups'][data_group]
+    keep_vars = {group_info['correlated_data'], group_info['flag'], 'FLAG'}
+    if locate:
+        group_vars = {info[name] for info in xds.attrs['data_groups'].values() for name in DATA_GROUP_VARS if name in info}
+        keep_vars.update(group_info[name] for name in DATA_GROUP_VARS if name in group_info)
+        keep_vars.update(var for var in xds.data_vars if var not in group_vars and 'TIME_CENTROID' not in var)
+    return xds.drop_vars([var for var in xds.data_vars if var not in keep_vars])
 
 def _select_ms(ps_xdt, logger, **selection):
     ''' Select ProcessingSet MeasurementSets for raster data. '''
     return select_ms(ps_xdt, logger, indexers=None, method=None, tolerance=None, **selection)
 
-def _select_raster_dimensions(ps_xdt, plot_inputs, logger):
+def _select_raster_dimensions(ps_xdt, plot_inputs, logger, select_function):
     ''' Select default dimensions if needed for raster data '''
     # Determine which dims must be selected, add to selection, and do selection
     dims_to_select = _get_raster_selection_dims(plot_inputs)
@@ -70,7 +121,7 @@ def _select_raster_dimensions(ps_xdt, plot_inputs, logger):
             selection.pop(plot_inputs['iter_axis'])
         logger.info(f"Applying raster plane selection (using first index or iter value): {dim_selection}")
         plot_inputs['dim_selection'] = dim_selection
-        return _select_ms(ps_xdt, logger, **dim_selection)
+        return select_function(ps_xdt, **dim_selection)
     return ps_xdt
 
 def _get_raster_selection_dims(plot_inputs):
@@ -136,30 +187,28 @@ def _add_index_dimensions(xds):
     return xds
 
 def aggregate_data(xds, plot_inputs, logger):
-    ''' Apply aggregator to agg axis list. '''
+    ''' Apply aggregator to agg axis list. Data variables are reduced chunk by chunk from mergeable partial states.
+        Correlated data is aggregated from unflagged data, or from flagged data where all data is flagged (FLAG 1). '''
     if not plot_inputs['aggregator']:
         return xds
 
     aggregator = plot_inputs['aggregator']
     agg_axis = plot_inputs['agg_axis']
-    agg_xds = xds
 
     # Check if agg axes have been selected (selection or iteration) and are no longer a dimension
     apply_agg_axis = [axis for axis in agg_axis if axis in xds.dims]
     logger.debug(f"Applying {aggregator} to {apply_agg_axis}.")
+    if not apply_agg_axis:
+        return xds
 
-    if aggregator == 'max':
-        agg_xds = xds.max(dim=apply_agg_axis, keep_attrs=True)
-    elif aggregator == 'mean':
-        agg_xds = xds.mean(dim=apply_agg_axis, keep_attrs=True)
-    elif aggregator == 'median':
-        agg_xds = xds.median(dim=apply_agg_axis, keep_attrs=True)
-    elif aggregator == 'min':
-        agg_xds = xds.min(dim=apply_agg_axis, keep_attrs=True)
-    elif aggregator == 'std':
-        agg_xds = xds.std(dim=apply_agg_axis, keep_attrs=True)
-    elif aggregator == 'sum':
-        agg_xds = xds.sum(dim=apply_agg_axis, keep_attrs=True)
-    elif aggregator == 'var':
-        agg_xds = xds.var(dim=apply_agg_axis, keep_attrs=True)
-    return agg_xds
+    correlated_data = get_correlated_data(xds, plot_inputs['data_group'])
+    agg_vars = {}
+    for name, xda in xds.data_vars.items():
+        agg_dims = [axis for axis in apply_agg_axis if axis in xda.dims]
+        if name == correlated_data:
+            agg_vars[name], agg_vars['FLAG'] = aggregate_flagged_xda(xda, xds.FLAG, aggregator, agg_dims)
+        elif agg_dims and name != 'FLAG':
+            agg_vars[name] = aggregate_xda(xda, aggregator, agg_dims)
+
+    # Remove variables and coordinates along agg axes, then add aggregated variables
+    return xds.drop_dims(apply_agg_axis).assign(agg_vars)
@@ -1,5 +1,6 @@
 ''' Apply selection dict to ProcessingSet and MeasurementSetXds '''
 
+import numpy as np
 from pandas import to_datetime
 
 import xarray as xr
@@ -156,19 +157,33 @@ def _sort_selections(ps, selection):
             baseline_selection[key] = val
     return dim_selection, time_selection, baseline_selection
 
-def _get_values_for_time_selection(ms_xdt, selection, method, tolerance, drop):
-    ''' Return list of times in time_list which can be selected from MeasurementSet. '''
-    ms_vals = []
-    for val in selection['time']:
-        try:
-            ms_selection = {'time': val}
-            ms_xdt.xr_ms.sel(indexers=None, method=method, tolerance=tolerance, drop=drop, **ms_selection)
-            # Selection succeeded, include this value
-            ms_vals.append(val)
-        except KeyError:
-            # Selection failed, do not include value
-            continue
-    return ms_vals
+def _get_time_indices(times, values, method, tolerance):
+    ''' Return index of time in sorted times for each value in list, using method ('nearest', 'pad'/'ffill',
+        or 'backfill'/'bfill') within tolerance, or -1 if no time can be selected (as pandas Index get_indexer). '''
+    values = np.asarray(values, dtype=times.dtype)
+    if times.size == 0:
+        return np.full(values.shape, -1)
+
+    pad_idx = np.searchsorted(times, values, side='right') - 1 # last time <= value, -1 if none
+    backfill_idx = np.searchsorted(times, values, side='left') # first time >= value, times.size if none
+    backfill_idx[backfill_idx == times.size] = -1
+
+    if method == 'nearest':
+        # Use backfill time if no pad time or equal distance
+        pad_distance = values - times[pad_idx]
+        backfill_distance = times[backfill_idx] - values
+        use_pad = (pad_idx != -1) & ((backfill_idx == -1) | (pad_distance < backfill_distance))
+        indices = np.where(use_pad, pad_idx, backfill_idx)
+    elif method in ['pad', 'ffill']:
+        indices = pad_idx
+    elif method in ['backfill', 'bfill']:
+        indices = backfill_idx
+    else:
+        raise ValueError(f"Invalid method {method} for time list selection")
+
+    if tolerance is not None:
+        indices[np.abs(times[indices] - values) > tolerance] = -1
+    return indices
 
 def _select_time(ms_xdt, selection, method, tolerance, drop):
     ''' Select MeasurementSet time dimension.
@@ -184,11 +199,14 @@ def _select_time(ms_xdt, selection, method, tolerance, drop):
 
     if isinstance(selection['time'], list):
         # Only use times which exist in this ms, since sel() fails if all items in list cannot be selected.
-        ms_times = _get_values_for_time_selection(ms_xdt, selection, time_method, time_tolerance, drop)
-        if not ms_times:
+        # Find all time indices at once and select them.
+        times = np.atleast_1d(ms_xdt.time.values)
+        time_indices = _get_time_indices(times, selection['time'], time_method, time_tolerance)
+        time_indices = time_indices[time_indices != -1]
+        if time_indices.size == 0:
             return ms_xdt, False
-        ms_time_selection = {'time': ms_times}
-        ms_xdt = ms_xdt.xr_ms.sel(indexers=None, method=time_method, tolerance=time_tolerance, drop=drop, **ms_time_selection)
+        if ms_xdt.time.ndim > 0:
+            ms_xdt = ms_xdt.isel(time=time_indices)
     else:
         # Select str or slice
         ms_xdt = ms_xdt.xr_ms.sel(indexers=None, method=time_method, tolerance=time_tolerance, drop=drop, **selection)
@@ -208,59 +226,44 @@ def _select_baseline(ms_xdt, selection):
     ''' Select MeasurementSet baseline/antenna coordinates.
         Return selected ms_xdt and whether selection succeeded.
     '''
-    baseline_ids = []
-    baseline_xda = ms_xdt.baseline_id
-
-    for key, val in selection.items():
-        if isinstance(val, str):
-            baseline_ids.extend(_get_baseline_ids(baseline_xda, key, val))
-        elif isinstance(val, list):
-            for item in val:
-                baseline_ids.extend(_get_baseline_ids(baseline_xda, key, item))
-        else:
-            raise TypeError("Can only select baselines and antennas by str or list")
+    baseline_mask = _get_baseline_mask(ms_xdt, selection)
+    success = bool(baseline_mask.any())
 
-    success = len(baseline_ids) > 0
-    if success:
-        baseline_ids = sorted(list(set(baseline_ids)))
+    if success and ms_xdt.baseline_id.ndim > 0:
+        baseline_ids = np.unique(ms_xdt.baseline_id.values[baseline_mask]).tolist()
         if len(baseline_ids) == 1:
             ms_xdt = ms_xdt.sel(baseline_id=baseline_ids[0])
         else:
             ms_xdt = ms_xdt.sel(baseline_id=baseline_ids)
     return ms_xdt, success
 
-def _get_baseline_ids(baseline_xda, key, val):
-    ''' Return list of baseline_ids for baseline or antenna selections. '''
-    if not isinstance(val, str):
-        raise TypeError("baseline/antenna selection value must be str")
-
-    antenna1 = None
-    antenna2 = None
-    if key == 'baseline':
-        ant1, ant2 = val.split('&')
-        antenna1 = ant1.strip()
-        antenna2 = ant2.strip()
-    elif key == 'antenna1':
-        antenna1 = val
-    elif key == 'antenna2':
-        antenna2 = val
+def _get_baseline_mask(ms_xdt, selection):
+    ''' Return boolean array for baseline_id which matches any baseline or antenna selection.
+        Selection values are matched all at once against the antenna names for each baseline_id. '''
+    ant1_names = np.atleast_1d(ms_xdt.baseline_antenna1_name.values).astype(str)
+    ant2_names = np.atleast_1d(ms_xdt.baseline_antenna2_name.values).astype(str)
+    baseline_names = None # "ant1 & ant2", only if needed
 
-    try:
-        sel_baseline_xda = None
-        # Select antenna1
-        if antenna1 is not None:
-            sel_baseline_xda = baseline_xda.sel(baseline_id=baseline_xda.baseline_antenna1_name==antenna1)
-
-        # Select antenna2
-        if antenna2 is not None:
-            if sel_baseline_xda is None:
-                sel_baseline_xda = baseline_xda.sel(baseline_id=baseline_xda.baseline_antenna2_name==antenna2)
-            else:
-                sel_baseline_xda = sel_baseline_xda.sel(baseline_id=sel_baseline_xda.baseline_antenna2_name==antenna2)
-
-        # Return baseline ids
-        if sel_baseline_xda is not None and sel_baseline_xda.size > 0:
-            return sel_baseline_xda.values.tolist()
-        return []
-    except KeyError:
-        return []
+    baseline_mask = np.zeros(ant1_names.size, dtype=bool)
+    for key, val in selection.items():
+        if isinstance(val, str):
+            val = [val]
+        elif not isinstance(val, list):
+            raise TypeError("Can only select baselines and antennas by str or list")
+        if not all(isinstance(item, str) for item in val):
+            raise TypeError("baseline/antenna selection value must be str")
+
+        if key == 'antenna1':
+            baseline_mask |= np.isin(ant1_names, val)
+        elif key == 'antenna2':
+            baseline_mask |= np.isin(ant2_names, val)
+        elif key == 'baseline':
+            if baseline_names is None:
+                baseline_names = np.char.add(np.char.add(ant1_names, " & "), ant2_names)
+            baseline_mask |= np.isin(baseline_names, [_get_baseline_name(item) for item in val])
+    return baseline_mask
+
+def _get_baseline_name(baseline):
+    ''' Return baseline selection "ant1&ant2" as "ant1 & ant2" '''
+    ant1, ant2 = baseline.split('&')
+    return f"{ant1.strip()} & {ant2.strip()}"
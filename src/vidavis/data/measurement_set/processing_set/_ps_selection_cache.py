@@ -0,0 +1,74 @@
+'''
+In-memory LRU cache of ProcessingSet selection results.
+'''
+
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+SELECTION_CACHE_SIZE = 32
+RASTER_SELECTION_CACHE_SIZE = 64 # raster plane selections, e.g. one per iteration value
+
+class PsSelectionCache:
+    '''
+    Cache selected ProcessingSet DataTrees (lazy, metadata only) by selection key.
+    A key is the tuple of selections applied in order to the original ProcessingSet since the selection was cleared,
+    so a selection added to a cached selection starts from the cached result, and returning to a previous selection
+    finds it by its prefix key.
+    Keys are matched exactly: selection values are not compared for containment, so a selection which narrows or
+    widens a cached selection with different arguments (e.g. a subset of its baselines) is not derived from it,
+    and is selected again from its prefix.
+    Least recently used entries are removed when the cache is full.
+    '''
+
+    def __init__(self, max_size=SELECTION_CACHE_SIZE):
+        self._max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock() # iteration plots select concurrently
+
+    def get(self, key):
+        ''' Return cached value for key, or None if not cached. '''
+        with self._lock:
+            if key not in self._cache:
+                return None
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+    def set(self, key, value):
+        ''' Add value for key, removing least recently used value if full. '''
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            if len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        ''' Remove all cached values '''
+        with self._lock:
+            self._cache.clear()
+
+def get_selection_key(name, **selection):
+    ''' Return hashable key for selection function name and its arguments '''
+    return (name, _freeze(selection))
+
+def is_selection_applied(selection_key, selection):
+    ''' Return whether selection (key for one selection) is included in a selection of selection_key with the same
+        function name and arguments. Selections are cumulative, so applying it again does not change the result.
+        Arguments must be equal; a selection whose values contain or are contained by applied values is not included. '''
+    name, args = selection
+    return any(applied_name == name and set(args) <= set(applied_args) for applied_name, applied_args in selection_key)
+
+def _freeze(value):
+    ''' Return hashable equivalent of selection value '''
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(val)) for key, val in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(val) for val in value)
+    if isinstance(value, np.ndarray):
+        return tuple(_freeze(val) for val in value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, slice):
+        return ('slice', _freeze(value.start), _freeze(value.stop), _freeze(value.step))
+    return value
@@ -2,6 +2,8 @@
    Calculate statistics on xradio ProcessingSet data.
 '''
 
+import zlib
+
 import dask
 import numpy as np
 
@@ -17,6 +19,7 @@ try:
 except ImportError:
     _HAVE_TOOLVIPER = False
 
+from vidavis.data.measurement_set.processing_set._quantile_sketch import QuantileSketch
 from vidavis.data.measurement_set.processing_set._xds_data import get_correlated_data, get_axis_data
 
 def calculate_ps_stats(ps_xdt, ps_store, vis_axis, data_group, logger):
@@ -45,20 +48,81 @@ def calculate_ps_stats(ps_xdt, ps_store, vis_axis, data_group, logger):
     logger.debug(f"Setting {n_threads} n_chunks for parallel coords.")
     mapping = _get_task_data_mapping(ps_xdt, n_threads)
 
-    data_min, data_max, data_mean = _calc_basic_stats(ps_xdt, mapping, input_params, logger)
+    data_min, data_max, data_mean, data_stddev = _calc_stats(ps_xdt, mapping, input_params, logger)
     if np.isfinite(data_mean):
-        input_params['mean'] = data_mean
-        data_stddev = _calc_stddev(ps_xdt, mapping, input_params, logger)
         return data_min, data_max, data_mean, data_stddev
     return None
 
+def get_quantiles_seed(zarr_path, selection, vis_axis):
+    ''' Return seed for quantile sampling derived from zarr path, selection, and vis axis,
+        so cached and recalculated quantiles are the same for the same data. '''
+    items = [str(zarr_path), vis_axis] + [f"{key}={selection[key]}" for key in sorted(selection)]
+    return zlib.crc32(",".join(items).encode())
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def calculate_ps_quantiles(ps_xdt, vis_axis, data_group, quantiles, sample_fraction, seed, logger):
+    '''
+        Estimate quantiles for unflagged visibilities from a strided sample of time chunks in each MSv4,
+        using a streaming quantile sketch.
+        ps_xdt (xarray.DataTree): input MeasurementSet opened from zarr file
+        vis_axis (str): complex component (amp, phase, real, imag)
+        data_group (str): correlated data to use for calculations
+        quantiles (tuple): quantile fractions (0-1) to estimate
+        sample_fraction (float): fraction of time chunks to read (0-1]
+        seed (int): seed for sampled chunk offsets and sketch compaction
+        Returns: tuple of quantile values or None if all sampled data flagged
+    '''
+    rng = np.random.default_rng(seed)
+    sketch = QuantileSketch(seed=int(rng.integers(2**32)))
+    n_chunks, sampled_xds = _sample_time_chunks(ps_xdt, data_group, sample_fraction, rng)
+
+    for chunk_xds in sampled_xds:
+        xda = _get_stats_xda(chunk_xds, vis_axis, data_group)
+        sketch.update(xda.values)
+
+    if sketch.count() == 0:
+        logger.debug("quantiles: no unflagged data in sampled chunks")
+        return None
+
+    values = sketch.quantiles(quantiles)
+    logger.debug(f"quantiles: sampled {len(sampled_xds)} of {n_chunks} time chunks ({sketch.count()} values), "
+        f"quantiles {quantiles}={values}, rank error < {sketch.rank_error():.4f}")
+    return tuple(values.tolist())
+# pylint: enable=too-many-arguments, too-many-positional-arguments
+
+def _sample_time_chunks(ps_xdt, data_group, sample_fraction, rng):
+    ''' Return number of time chunks in MSv4s with data group, and list of datasets for a strided sample of
+        time chunks with random offset in each MSv4 '''
+    stride = max(1, round(1.0 / sample_fraction))
+    n_chunks = 0
+    sampled_xds = []
+    for ms_xdt in ps_xdt.values():
+        if data_group not in ms_xdt.attrs['data_groups']:
+            continue
+        xds = ms_xdt.ds
+        time_slices = _get_time_chunk_slices(xds, get_correlated_data(xds, data_group))
+        n_chunks += len(time_slices)
+        sampled_slices = time_slices[rng.integers(min(stride, len(time_slices)))::stride]
+        sampled_xds.extend(xds.isel(time=time_slice) for time_slice in sampled_slices)
+    return n_chunks, sampled_xds
+
+def _get_time_chunk_slices(xds, correlated_data):
+    ''' Return list of time slices for each chunk of correlated data along time dimension '''
+    xda = xds[correlated_data]
+    if xda.chunks:
+        chunk_sizes = xda.chunks[xda.dims.index('time')]
+    else:
+        chunk_sizes = (xds.sizes['time'],)
+    bounds = np.cumsum((0,) + tuple(chunk_sizes))
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
 def _get_task_data_mapping(ps_xdt, n_threads):
     frequencies = ps_xdt.xr_ps.get_freq_axis()
     parallel_coords = {"frequency": make_parallel_coord(coord=frequencies, n_chunks=n_threads)}
     return interpolate_data_coords_onto_parallel_coords(parallel_coords, ps_xdt)
 
-def _calc_basic_stats(ps_xdt, mapping, input_params, logger):
-    ''' Calculate min, max, mean using graph map/reduce '''
+def _calc_stats(ps_xdt, mapping, input_params, logger):
+    ''' Calculate min, max, mean, and stddev in a single pass using graph map/reduce '''
     graph = graph_map(
         input_data=ps_xdt,
         node_task_data_mapping=mapping,
@@ -72,34 +136,15 @@ def _calc_basic_stats(ps_xdt, mapping, input_params, logger):
     #dask_graph.visualize(filename='stats.png')
     results = dask.compute(dask_graph)
 
-    data_min, data_max, data_sum, data_count = results[0]
-    if data_count == 0.0:
+    data_count, data_mean, data_m2, data_min, data_max = results[0]
+    if data_count == 0:
         logger.debug("stats: no unflagged data")
-        return (data_min, data_max, np.inf)
+        return (data_min, data_max, np.inf, np.nan)
 
-    data_mean = data_sum / data_count
-    logger.debug(f"basic stats: min={data_min:.4f}, max={data_max:.4f}, sum={data_sum:.4f}, count={data_count} mean={data_mean:.4f}")
-    return data_min, data_max, data_mean
-
-def _calc_stddev(ps_xdt, mapping, input_params, logger):
-    ''' Calculate stddev using graph map/reduce '''
-    graph = graph_map(
-        input_data=ps_xdt,
-        node_task_data_mapping=mapping,
-        node_task=_map_variance,
-        input_params=input_params
-    )
-    reduce_map = graph_reduce(
-        graph, _reduce_variance, input_params, mode='tree'
-    )
-    dask_graph = generate_dask_workflow(reduce_map)
-    results = dask.compute(dask_graph)
-
-    var_sum, var_count = results[0]
-    data_variance = var_sum / var_count
+    data_variance = data_m2 / data_count
     data_stddev = data_variance ** 0.5
-    logger.debug(f"stats: variance={data_variance:.4f}, stddev={data_stddev:.4f}")
-    return data_stddev
+    logger.debug(f"stats: min={data_min:.4f}, max={data_max:.4f}, count={data_count}, mean={data_mean:.4f}, variance={data_variance:.4f}, stddev={data_stddev:.4f}")
+    return data_min, data_max, data_mean, data_stddev
 
 def _get_stats_xda(xds, vis_axis, data_group):
     ''' Return xda with only unflagged cross-corr visibility data '''
@@ -119,15 +164,39 @@ def _get_stats_xda(xds, vis_axis, data_group):
     # return xda with nan where flagged
     return unflagged_xda
 
+def _get_chunk_stats(xda):
+    ''' Return (count, mean, M2, min, max) of non-nan values in xda.
+        M2 is the sum of squared differences from the mean. '''
+    xda_data = xda.values.ravel().astype(np.float64) # accumulate in double precision
+    xda_data = xda_data[~np.isnan(xda_data)]
+    count = xda_data.size
+    if count == 0:
+        return (0, 0.0, 0.0, np.nan, np.nan)
+    mean = xda_data.mean()
+    m2 = np.square(xda_data - mean).sum()
+    return (count, mean, m2, xda_data.min(), xda_data.max())
+
+def _combine_stats(stats1, stats2):
+    ''' Merge two (count, mean, M2, min, max) tuples using the Chan et al. parallel algorithm. '''
+    count1, mean1, m2_1 = stats1[:3]
+    count2, mean2, m2_2 = stats2[:3]
+    if count1 == 0:
+        return stats2
+    if count2 == 0:
+        return stats1
+
+    count = count1 + count2
+    delta = mean2 - mean1
+    mean = mean1 + delta * count2 / count
+    m2 = m2_1 + m2_2 + delta * delta * count1 * count2 / count
+    return (count, mean, m2, min(stats1[3], stats2[3]), max(stats1[4], stats2[4]))
+
 def _map_stats(input_params):
-    ''' Return min, max, sum, and count of data chunk '''
+    ''' Return count, mean, M2, min, and max of data chunk '''
     vis_axis = input_params['vis_axis']
     data_group = input_params['data_group']
     correlated_data = input_params['correlated_data']
-    min_vals = []
-    max_vals = []
-    sum_vals = []
-    count_vals = []
+    stats = (0, 0.0, 0.0, np.nan, np.nan)
 
     ps_iter = ProcessingSetIterator(
         input_params['data_selection'],
@@ -140,79 +209,20 @@ def _map_stats(input_params):
 
     for xds in ps_iter:
         xda = _get_stats_xda(xds, vis_axis, data_group)
-        if xda.count() > 0:
-            xda_data = xda.values.ravel()
-            try:
-                min_vals.append(xda_data[np.nanargmin(xda_data)])
-            except ValueError:
-                pass
-            try:
-                max_vals.append(xda_data[np.nanargmax(xda_data)])
-            except ValueError:
-                pass
-            sum_vals.append(np.nansum(xda))
-            count_vals.append(xda.count().values)
-    try:
-        min_value = np.nanmin(min_vals)
-    except ValueError:
-        min_value = np.nan
-    try:
-        max_value = np.nanmax(max_vals)
-    except ValueError:
-        max_value = np.nan
-    return (min_value, max_value, sum(sum_vals), sum(count_vals))
+        stats = _combine_stats(stats, _get_chunk_stats(xda))
+    return stats
 
 # pylint: disable=unused-argument
 def _reduce_stats(graph_inputs, input_params):
-    ''' Compute min, max, sum, and count of all data.
-        input_parameters seems to be required although unused. '''
-    data_min = 0.0
-    mins = [values[0] for values in graph_inputs]
-    if not np.isnan(mins).all():
-        data_min = min(0.0, np.nanmin(mins))
-
-    data_max = 0.0
-    maxs = [values[1] for values in graph_inputs]
-    if not np.isnan(maxs).all():
-        data_max = max(0.0, np.nanmax(maxs))
-
-    data_sum = sum(values[2] for values in graph_inputs)
-    data_count = sum(values[3] for values in graph_inputs)
-    return (data_min, data_max, data_sum, data_count)
-# pylint: enable=unused-argument
-
-def _map_variance(input_params):
-    ''' Return sum, count, of (xda - mean) squared '''
-    vis_axis = input_params['vis_axis']
-    data_group = input_params['data_group']
-    correlated_data = input_params['correlated_data']
-    mean = input_params['mean']
-
-    sq_diff_sum = 0.0
-    sq_diff_count = 0
-
-    ps_iter = ProcessingSetIterator(
-        input_params['data_selection'],
-        input_params['input_data_store'],
-        input_params['xdt'],
-        input_params['data_group'],
-        include_variables=[correlated_data, 'FLAG'],
-        load_sub_datasets=False
-    )
-
-    for xds in ps_iter:
-        xda = _get_stats_xda(xds, vis_axis, data_group)
-        if xda.size > 0:
-            sq_diff = (xda - mean) ** 2
-            sq_diff_sum += np.nansum(sq_diff)
-            sq_diff_count += sq_diff.count().values
-    return (sq_diff_sum, sq_diff_count)
-
-# pylint: disable=unused-argument
-def _reduce_variance(graph_inputs, input_params):
-    ''' Compute sum and count of all (xda-mean) squared data.
+    ''' Merge count, mean, M2, min, and max of all data chunks.
         input_parameters seems to be required although unused. '''
-    sq_diff_sum = sum(values[0] for values in graph_inputs)
-    sq_diff_count = sum(values[1] for values in graph_inputs)
-    return (sq_diff_sum, sq_diff_count)
+    stats = (0, 0.0, 0.0, np.nan, np.nan)
+    for values in graph_inputs:
+        stats = _combine_stats(stats, values)
+
+    # Include zero in data range
+    data_count, data_mean, data_m2, data_min, data_max = stats
+    data_min = 0.0 if np.isnan(data_min) else min(0.0, data_min)
+    data_max = 0.0 if np.isnan(data_max) else max(0.0, data_max)
+    return (data_count, data_mean, data_m2, data_min, data_max)
 # pylint: enable=unused-argument
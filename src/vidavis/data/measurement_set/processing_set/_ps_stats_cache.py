@@ -0,0 +1,122 @@
+'''
+Persistent cache of ProcessingSet statistics in a sidecar file next to the zarr store.
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+STATS_CACHE_EXT = ".stats.json"
+ZARR_METADATA_FILES = ('zarr.json', '.zarray', '.zattrs', '.zgroup', '.zmetadata')
+# Directory levels in fingerprint: root, MSv4, and variable or subgroup directories
+FINGERPRINT_DEPTH = 2
+
+class PsStatsCache:
+    '''
+    Cache visibility statistics on disk so they survive between sessions.
+    Entries are keyed by selection (e.g. spw_name, data_group_name) and vis axis,
+    and are invalidated when the zarr store path or modification fingerprint changes.
+    The fingerprint is computed once, when the cache is first used, from the modification times of the root, MSv4,
+    and variable directories and their zarr metadata files, so adding, removing, or rewriting an MSv4 or variable
+    invalidates the cache in the next session. Chunk files are not included.
+    '''
+
+    def __init__(self, zarr_path, logger):
+        self._zarr_path = os.path.abspath(zarr_path)
+        self._cache_path = self._zarr_path + STATS_CACHE_EXT
+        self._logger = logger
+        self._fingerprint = None
+        self._stats = None # loaded on first use
+        self._lock = threading.Lock() # shared by sessions of gui server
+
+    def get_stats(self, selection, vis_axis):
+        ''' Return cached stats tuple (min, max, mean, stddev) for selection and vis_axis, or None if not cached. '''
+        with self._lock:
+            stats = self._load_stats()
+            key = self._get_key(selection, vis_axis)
+            if key in stats:
+                self._logger.debug(f"Using cached stats for {key} from {self._cache_path}")
+                return tuple(stats[key])
+            return None
+
+    def set_stats(self, selection, vis_axis, stats):
+        ''' Save stats tuple (min, max, mean, stddev) for selection and vis_axis and write cache file. '''
+        if stats is None:
+            return
+        with self._lock:
+            cached_stats = self._load_stats()
+            cached_stats[self._get_key(selection, vis_axis)] = [float(value) for value in stats]
+            self._write_stats()
+
+    def _get_key(self, selection, vis_axis):
+        ''' Return canonical string key for selection dict and vis axis '''
+        items = [f"{key}={selection[key]}" for key in sorted(selection)]
+        items.append(f"vis_axis={vis_axis}")
+        return ",".join(items)
+
+    def _load_stats(self):
+        ''' Return loaded stats, else read cache file if it matches current store or start empty cache '''
+        if self._stats is not None:
+            return self._stats
+
+        self._stats = {}
+        self._fingerprint = _get_store_fingerprint(self._zarr_path)
+        if not os.path.exists(self._cache_path):
+            return self._stats
+
+        try:
+            with open(self._cache_path, 'r', encoding='utf-8') as cache_file:
+                cache = json.load(cache_file)
+            if cache['store'] == self._zarr_path and cache['fingerprint'] == self._fingerprint:
+                self._stats = cache['stats']
+            else:
+                self._logger.debug(f"Zarr store changed, ignoring stats cache {self._cache_path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self._logger.debug(f"Cannot read stats cache {self._cache_path}: {e}")
+        return self._stats
+
+    def _write_stats(self):
+        ''' Write cache file atomically, so readers never see a partial file; failure (e.g. read-only directory) is
+            not an error '''
+        cache = {'store': self._zarr_path, 'fingerprint': self._fingerprint, 'stats': self._stats}
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(self._cache_path),
+                prefix=os.path.basename(self._cache_path), suffix='.tmp', delete=False) as cache_file:
+                temp_path = cache_file.name
+                json.dump(cache, cache_file, indent=2)
+            os.replace(temp_path, self._cache_path)
+        except OSError as e:
+            self._logger.debug(f"Cannot write stats cache {self._cache_path}: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+def _get_store_fingerprint(zarr_path):
+    ''' Return hash of modification times of root, MSv4, and variable directories in zarr store and their zarr
+        metadata files '''
+    fingerprint = hashlib.sha1()
+    dir_paths = [zarr_path]
+    for _ in range(FINGERPRINT_DEPTH + 1):
+        sub_dir_paths = []
+        for dir_path in dir_paths:
+            paths = [dir_path]
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in sorted(entries, key=lambda entry: entry.name):
+                        if entry.is_dir():
+                            sub_dir_paths.append(entry.path)
+                        elif entry.name in ZARR_METADATA_FILES:
+                            paths.append(entry.path)
+            except OSError:
+                pass
+
+            for path in paths:
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime = 0
+                fingerprint.update(f"{os.path.relpath(path, zarr_path)}:{mtime};".encode('utf-8'))
+        dir_paths = sub_dir_paths
+    return fingerprint.hexdigest()
@@ -0,0 +1,89 @@
+'''
+ProcessingSet opened from a zarr store and its caches, shared by all users of the store in this process.
+'''
+
+import os
+import threading
+import weakref
+
+from vidavis.data.measurement_set.processing_set._ps_io import get_processing_set
+from vidavis.data.measurement_set.processing_set._ps_raster_cache import PsRasterCache
+from vidavis.data.measurement_set.processing_set._ps_selection_cache import PsSelectionCache, RASTER_SELECTION_CACHE_SIZE
+from vidavis.data.measurement_set.processing_set._ps_stats_cache import PsStatsCache
+
+# Stores by input path (MSv2 or zarr) and zarr path, removed when no longer used
+_STORES = weakref.WeakValueDictionary()
+_STORES_LOCK = threading.Lock()
+# Locks by input path, so a store is opened (or converted) once; removed when no thread is opening the store
+_OPEN_LOCKS = weakref.WeakValueDictionary()
+
+class PsStore:
+    '''
+    Opened ProcessingSet and caches which do not depend on the selection state of its users:
+    selected ProcessingSets by selection key, raster plane selections of them, computed raster planes by raster data key, dimension values and
+    summaries of the original ProcessingSet, and persistent statistics. Shared by PsData objects for the same zarr store, e.g. sessions of the MsRaster
+    GUI server, so memory and I/O grow with the number of stores rather than the number of users.
+    '''
+
+    def __init__(self, ms, logger, chunk_axes=None):
+        # Open processing set from zarr. Converts msv2 if ms path is not zarr
+        self._ps_xdt, self._zarr_path = get_processing_set(ms, logger, chunk_axes)
+        self._selection_cache = PsSelectionCache() # (selected ps_xdt, dimension values) by selection key
+        self._raster_selection_cache = PsSelectionCache(RASTER_SELECTION_CACHE_SIZE) # raster plane ps_xdt by key
+        self._raster_cache = PsRasterCache() # (raster xds, raster selection) by raster data key
+        self._stats_cache = PsStatsCache(self._zarr_path, logger)
+        self._dimension_values = {} # unique values by dimension for original ps_xdt
+        self._summaries = {} # summary DataFrame by data group for original ps_xdt
+        self._lock = threading.Lock()
+
+    def get_ps_xdt(self):
+        ''' Return original ProcessingSet '''
+        return self._ps_xdt
+
+    def get_zarr_path(self):
+        ''' Return path to zarr file (input or converted from msv2) '''
+        return self._zarr_path
+
+    def get_selection_cache(self):
+        ''' Return shared selection cache '''
+        return self._selection_cache
+
+    def get_raster_selection_cache(self):
+        ''' Return shared raster plane selection cache, separate so raster selections do not evict user selections '''
+        return self._raster_selection_cache
+
+    def get_raster_cache(self):
+        ''' Return shared raster plane cache '''
+        return self._raster_cache
+
+    def get_stats_cache(self):
+        ''' Return shared persistent stats cache '''
+        return self._stats_cache
+
+    def get_dimension_values(self):
+        ''' Return shared dict of unique values by dimension for original ProcessingSet '''
+        return self._dimension_values
+
+    def get_summary(self, data_group):
+        ''' Return summary DataFrame of original ProcessingSet for data group '''
+        with self._lock:
+            if data_group not in self._summaries:
+                self._summaries[data_group] = self._ps_xdt.xr_ps.summary(data_group)
+            return self._summaries[data_group]
+
+def get_ps_store(ms, logger, chunk_axes=None):
+    ''' Return PsStore for ms path, opening it if it is not in use in this process. '''
+    ms_path = os.path.abspath(ms.rstrip('/'))
+    with _STORES_LOCK:
+        open_lock = _OPEN_LOCKS.setdefault(ms_path, threading.Lock())
+
+    with open_lock:
+        store = _STORES.get(ms_path)
+        if store is None:
+            store = PsStore(ms, logger, chunk_axes)
+            with _STORES_LOCK:
+                _STORES[ms_path] = store
+                _STORES[os.path.abspath(store.get_zarr_path())] = store
+        else:
+            logger.debug(f"Using ProcessingSet {store.get_zarr_path()} opened in this process")
+    return store
@@ -0,0 +1,96 @@
+'''
+Mergeable streaming quantile sketch for estimating quantiles of large data.
+'''
+
+import numpy as np
+
+class QuantileSketch:
+    '''
+    Streaming quantile sketch using a hierarchy of compactors (KLL style).
+    Items at level h have weight 2**h. When a level exceeds capacity, its sorted items
+    are compacted by keeping every other item (random offset) and promoting them to the
+    next level. Sketches can be merged, so partial sketches may be computed per chunk.
+
+    Args:
+        capacity (int): maximum items per level before compaction. Larger is more accurate.
+        seed (None, int): seed for random compaction offsets.
+    '''
+
+    def __init__(self, capacity=1024, seed=None):
+        self._capacity = capacity
+        self._levels = [np.empty(0)]
+        self._count = 0
+        self._error_variance = 0.0 # sum of squared compaction weights
+        self._rng = np.random.default_rng(seed)
+
+    def count(self):
+        ''' Return number of values added to sketch '''
+        return self._count
+
+    def update(self, values):
+        ''' Add array of values to sketch; nan values are ignored. '''
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self._count += values.size
+        self._levels[0] = np.concatenate((self._levels[0], values))
+        self._compact()
+
+# pylint: disable=protected-access
+    def merge(self, other):
+        ''' Merge items from another QuantileSketch into this one '''
+        for level, items in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(np.empty(0))
+            self._levels[level] = np.concatenate((self._levels[level], items))
+        self._count += other._count
+        self._error_variance += other._error_variance
+        self._compact()
+# pylint: enable=protected-access
+
+    def quantiles(self, fractions):
+        ''' Return array of estimated values at quantile fractions (0-1), nan if sketch is empty. '''
+        fractions = np.atleast_1d(np.asarray(fractions, dtype=float))
+        if self._count == 0:
+            return np.full(fractions.shape, np.nan)
+
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(level_items.size, 2.0 ** level) for level, level_items in enumerate(self._levels)])
+        order = np.argsort(items, kind='stable')
+        items = items[order]
+        cum_weights = np.cumsum(weights[order])
+
+        indices = np.searchsorted(cum_weights, fractions * cum_weights[-1], side='left')
+        return items[np.clip(indices, 0, items.size - 1)]
+
+    def rank_error(self, confidence=0.99):
+        ''' Return bound on normalized rank error of quantile estimates at confidence level (Hoeffding bound).
+            Zero when no compaction was needed (exact). '''
+        if self._count == 0 or self._error_variance == 0.0:
+            return 0.0
+        rank_error = np.sqrt(2.0 * np.log(2.0 / (1.0 - confidence)) * self._error_variance)
+        return min(1.0, rank_error / self._count)
+
+    def _compact(self):
+        ''' Compact each level which exceeds capacity into next level '''
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if items.size > self._capacity:
+                items = np.sort(items)
+
+                # Keep one item at this level if odd number of items
+                keep = items[:0]
+                if items.size % 2:
+                    keep = items[-1:]
+                    items = items[:-1]
+
+                # Keep every other item with random offset; each compaction adds rank error at most 2**level
+                promoted = items[self._rng.integers(2)::2]
+                self._levels[level] = keep
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                self._levels[level + 1] = np.concatenate((self._levels[level + 1], promoted))
+                self._error_variance += 4.0 ** level
+            level += 1
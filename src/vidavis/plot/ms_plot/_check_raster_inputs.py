@@ -2,7 +2,14 @@
 Check inputs to MsRaster plot() or its GUI
 '''
 
-from vidavis.plot.ms_plot._ms_plot_constants import VIS_AXIS_OPTIONS, AGGREGATOR_OPTIONS
+try:
+    # server-side rasterization for hvPlot
+    import datashader # pylint: disable=unused-import
+    _HAVE_DATASHADER = True
+except ImportError:
+    _HAVE_DATASHADER = False
+
+from vidavis.plot.ms_plot._ms_plot_constants import VIS_AXIS_OPTIONS, AGGREGATOR_OPTIONS, RASTER_REDUCTION_OPTIONS
 
 def check_inputs(inputs):
     ''' Check plot input types, and axis (plot, agg, iter) input values. '''
@@ -10,6 +17,7 @@ def check_inputs(inputs):
     _check_axis_inputs(inputs)
     _check_agg_inputs(inputs)
     _check_color_inputs(inputs)
+    _check_rasterize_inputs(inputs)
     _check_other_inputs(inputs)
 
 def _set_baseline_antenna_axis(inputs):
@@ -85,7 +93,7 @@ def _check_agg_inputs(inputs):
 def _check_color_inputs(inputs):
     if inputs['color_mode']:
         color_mode = inputs['color_mode'].lower()
-        valid_color_modes = ['auto', 'manual']
+        valid_color_modes = ['auto', 'auto_fast', 'manual']
         if color_mode not  in valid_color_modes:
             raise ValueError(f"Invalid parameter value: color_mode {color_mode} must be None or one of {valid_color_modes}.")
         inputs['color_mode'] = color_mode
@@ -94,7 +102,30 @@ def _check_color_inputs(inputs):
         if not (isinstance(inputs['color_range'], tuple) and len(inputs['color_range']) == 2):
             raise ValueError("Invalid parameter type: color_range must be None or a tuple of (min, max).")
 
+def _check_rasterize_inputs(inputs):
+    if 'rasterize' not in inputs:
+        return
+
+    if not isinstance(inputs['rasterize'], bool):
+        raise TypeError("Invalid parameter type: rasterize must be True or False.")
+    if inputs['rasterize'] and not _HAVE_DATASHADER:
+        raise RuntimeError("Cannot rasterize plot: datashader not installed.")
+
+    if not isinstance(inputs['pyramid'], bool):
+        raise TypeError("Invalid parameter type: pyramid must be True or False.")
+    if inputs['rasterize'] and inputs['pyramid']:
+        raise ValueError("Invalid parameter values: rasterize and pyramid cannot both be True.")
+
+    if inputs['raster_reduction'] not in RASTER_REDUCTION_OPTIONS:
+        raise ValueError(f"Invalid parameter value: raster_reduction {inputs['raster_reduction']} must be one of {RASTER_REDUCTION_OPTIONS}.")
+
+    if 'compact' in inputs and not isinstance(inputs['compact'], bool):
+        raise TypeError("Invalid parameter type: compact must be True or False.")
+
 def _check_other_inputs(inputs):
+    if 'locate' in inputs and not isinstance(inputs['locate'], bool):
+        raise TypeError("Invalid parameter type: locate must be True or False.")
+
     if inputs['iter_range']:
         if not (isinstance(inputs['iter_range'], tuple) and len(inputs['iter_range']) == 2):
             raise ValueError("Invalid parameter type: iter_range must be None or a tuple of (start, end).")
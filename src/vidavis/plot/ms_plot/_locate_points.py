@@ -1,14 +1,20 @@
 '''
     Return x, y, and metadata for cursor position or multiple points in selected box.
-    Values are formatted into Panel StaticText and put in row/col format (cursor location)
-    or single line (box location).
+    Values are formatted into Panel StaticText and put in row/col format (cursor location, points),
+    or into a table with one row per point (box location).
 '''
 
+from datetime import datetime
+
 import numpy as np
+import pandas as pd
 from pandas import to_datetime
 import panel as pn
 
-from vidavis.plot.ms_plot._ms_plot_constants import TIME_FORMAT
+from vidavis.plot.ms_plot._ms_plot_constants import LOCATE_PAGE_SIZE, TIME_FORMAT
+
+# Index coordinates with name coordinate, shown as "name (index)"
+INDEX_COORDS = {'baseline': 'baseline_name', 'antenna_name': 'antenna', 'polarization': 'polarization_name'}
 
 def get_locate_value(xds, coord, value):
     ''' Convert index coordinates to int and float time coordinate to datetime. Select nearest value <= value. '''
@@ -38,19 +44,81 @@ def get_new_data(data, last_data):
         new_data = data
     return new_data
 
-def update_cursor_location(cursor, plot_axes, xds, cursor_locate_box):
-    ''' Show data values for cursor x,y position in cursor location box (pn.WidgetBox) '''
-    # Convert plot values to selection values to select plot data
-    cursor_locate_box.clear()
-    x, y = cursor
-    x_axis, y_axis, vis_axis = plot_axes
+# pylint: disable=too-few-public-methods
+class LocateIndex:
+    '''
+    Location values of each point in plot data, computed once per plot so that a cursor position is located with
+    array lookups instead of selecting the plot data.
+        xds (Xarray Dataset): data for plot
+        plot_axes (tuple): (x_axis, y_axis, vis_axis)
+    '''
 
-    cursor_position = {x_axis: x, y_axis: y}
-    cursor_location = _locate_point(xds, cursor_position, vis_axis)
+    def __init__(self, xds, plot_axes):
+        x_axis, y_axis, vis_axis = plot_axes
+        xds = xds.compute()
+        self._dims = (y_axis, x_axis)
+        shape = (xds.sizes[y_axis], xds.sizes[x_axis])
+
+        # Axis values in plot units sorted for nearest search
+        self._axis_order = []
+        self._axis_values = []
+        for axis in self._dims:
+            values = _get_plot_units(xds[axis].values)
+            order = np.argsort(values, kind='stable')
+            self._axis_order.append(order)
+            self._axis_values.append(values[order])
+
+        self._values, self._units = _get_location_arrays(xds, self._dims, shape)
+        if 'VISIBILITY' in self._values:
+            self._values[vis_axis.upper()] = self._values.pop('VISIBILITY')
+
+    def locate(self, x, y):
+        ''' Return location of point nearest to plot x, y position as list of (name, formatted value) '''
+        index = tuple(self._get_nearest_index(axis, value) for axis, value in enumerate((y, x)))
+
+        # Position first (x, y), then coordinates and data vars
+        values = {}
+        for name in self._dims[::-1] + tuple(self._values):
+            value = self._values[name][index]
+            values[name] = value.item() if isinstance(value, np.generic) and not isinstance(value, np.datetime64) else value
+        return _get_location_items(values, self._units.copy())
+
+    def _get_nearest_index(self, axis, value):
+        ''' Return index of axis value nearest to plot value '''
+        axis_values = self._axis_values[axis]
+        value = _get_plot_units(value)
+        i = int(np.clip(np.searchsorted(axis_values, value), 1, len(axis_values) - 1)) if len(axis_values) > 1 else 0
+        if i > 0 and abs(value - axis_values[i - 1]) <= abs(axis_values[i] - value):
+            i -= 1
+        return int(self._axis_order[axis][i])
+# pylint: enable=too-few-public-methods
+
+def _get_plot_units(values):
+    ''' Convert datetime values to float milliseconds since epoch (Bokeh datetime units) '''
+    if isinstance(values, (datetime, pd.Timestamp)):
+        values = np.datetime64(values)
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64) / 1e6
+    return values.astype(float)
+
+def update_cursor_location(cursor, locate_index, cursor_locate_box):
+    ''' Show data values for cursor x,y position in cursor location box (pn.WidgetBox) using plot LocateIndex.
+        Values of the StaticText widgets are updated if the location names have not changed. '''
+    cursor_location = locate_index.locate(*cursor)
+
+    location_text = [static_text for static_text in cursor_locate_box.select(pn.widgets.StaticText)
+        if static_text.name != "CURSOR LOCATION"]
+    if [static_text.name for static_text in location_text] == [name for name, _ in cursor_location]:
+        for static_text, (_, value) in zip(location_text, cursor_location):
+            static_text.value = value
+        return
 
     # Add row of columns to column layout
+    cursor_locate_box.clear()
     location_column = pn.Column(pn.widgets.StaticText(name="CURSOR LOCATION"))
-    location_row = _layout_point_location(cursor_location)
+    location_text = [pn.widgets.StaticText(name=name, value=value) for name, value in cursor_location]
+    location_row = _layout_point_location(location_text)
     location_column.append(location_row)
 
     # Add location column to widget box
@@ -75,31 +143,46 @@ def update_points_location(points, plot_axes, xds, points_tab_feed):
         locate_log.append(", ".join(location_list))
     return locate_log
 
-# pylint: disable=too-many-locals
 def update_boxes_location(boxes, plot_axes, xds, box_tab_feed):
-    ''' Show data values for points in box_select in tab and log '''
+    ''' Show data values for points in box_select in tab, and log box bounds and number of points with values for
+        the first page of points '''
     locate_log = []
     x_axis, y_axis, vis_axis = plot_axes
     for box in boxes:
         box_bounds = {x_axis: (box[0], box[2]), y_axis: (box[1], box[3])}
-        npoints, point_locations = _locate_box(xds, box_bounds, vis_axis)
+        npoints, location_df = _locate_box(xds, box_bounds, vis_axis)
 
-        message = f"Locate {npoints} points"
-        message += " (only first 100 shown):" if npoints > 100 else ":"
-        locate_log.append(message)
+        message = f"Locate {npoints} points:"
+        locate_log.append(f"Locate {npoints} points in box {_get_bounds_text(xds, box_bounds)}")
         box_tab_feed.append(pn.pane.Str(message))
 
-        for point in point_locations:
-            # Format and add to box locate column
-            location_layout = _layout_point_location(point)
-            box_tab_feed.append(location_layout)
-            box_tab_feed.append(pn.layout.Divider())
+        if npoints > 0:
+            # Add table of locations to box locate column
+            box_tab_feed.append(pn.widgets.Tabulator(location_df, disabled=True, show_index=False,
+                pagination='remote', page_size=LOCATE_PAGE_SIZE, sizing_mode='stretch_width'))
 
-            # Format and add to log
-            location_list = [f"{static_text.name}={static_text.value}" for static_text in point]
-            locate_log.append(", ".join(location_list))
+            # Format "name=value" for first page of locations and add to log; all points are in table
+            locate_log.extend(_get_location_log(location_df.head(LOCATE_PAGE_SIZE)).tolist())
+            if npoints > LOCATE_PAGE_SIZE:
+                locate_log.append(f"Logged first {LOCATE_PAGE_SIZE} of {npoints} points")
     return locate_log
-# pylint: enable=too-many-locals
+
+def _get_bounds_text(xds, bounds):
+    ''' Return "name=(start, end) unit" for each coordinate in box bounds, formatted as location values '''
+    bounds_list = []
+    for name, (start, end) in bounds.items():
+        unit = _get_xda_unit(xds[name]) if name in xds.coords else ''
+        start, end = _format_location_values(name, np.array([start, end]), unit).str.strip()
+        bounds_list.append(f"{name}=({start}, {end})")
+    return ", ".join(bounds_list)
+
+def _get_location_log(location_df):
+    ''' Return pandas Series of "name=value, ..." for each location in DataFrame of formatted values '''
+    location_log = None
+    for name in location_df.columns:
+        name_value = name + "=" + location_df[name]
+        location_log = name_value if location_log is None else location_log + ", " + name_value
+    return location_log
 
 def _locate_point(xds, position, vis_axis):
     '''
@@ -110,31 +193,39 @@ def _locate_point(xds, position, vis_axis):
         Returns:
             list of pn.widgets.StaticText(name, value) with value formatted for its type
     '''
-    static_text_list = []
     values, units = _get_point_location(xds, position, vis_axis)
+    return _get_location_text_list(values, units)
+
+def _get_location_text_list(values, units):
+    ''' Return list of pn.widgets.StaticText(name, value) for location values and units '''
+    return [pn.widgets.StaticText(name=name, value=value) for name, value in _get_location_items(values, units)]
+
+def _get_location_items(values, units):
+    ''' Return list of (name, formatted value) for location values and units '''
+    location_items = []
 
     # List indexed coordinate int value with with str value
-    index_coords = {'baseline': 'baseline_name', 'antenna_name': 'antenna', 'polarization': 'polarization_name'}
     for name, value in values.items():
-        if name in index_coords.values():
+        if name in INDEX_COORDS.values():
             continue
-        if name in index_coords and isinstance(value, int):
-            value = f"{values[index_coords[name]]} ({value})" # append name to index
-        static_text = _get_location_text(name, value, units)
-        static_text_list.append(static_text)
-    return static_text_list
+        if name in INDEX_COORDS and isinstance(value, int):
+            value = f"{values[INDEX_COORDS[name]]} ({value})" # append name to index
+        location_items.append((name, _format_location_value(name, value, units)))
+    return location_items
 
 def _locate_box(xds, bounds, vis_axis):
     '''
         Get location of each point in box bounds as values of coordinate and data vars.
+        The box is selected once, and each value is gathered for all points as an array and formatted by column.
             xds (Xarray Dataset): data for plot
             bounds (dict): {coordinate: (start, end)} of x and y axis ranges
             vis_axis (str): visibility component of complex value
         Returns:
-            list of list of pn.widgets.StaticText(name, value), one list per point.
+            number of points in box, and pandas DataFrame of formatted values with one row per point (y, x order)
+            and one column per location item.
     '''
-    points = []
     npoints = 0
+    columns = {}
 
     if xds:
         try:
@@ -142,25 +233,74 @@ def _locate_box(xds, bounds, vis_axis):
             for coord, val in bounds.items():
                 # Round index values to int for selection
                 selection[coord] = slice(get_locate_value(xds, coord, val[0]), get_locate_value(xds, coord, val[1]))
-            sel_xds = xds.sel(indexers=None, method=None, tolerance=None, drop=False, **selection)
-            sel_xds.compute()
+            sel_xds = xds.sel(indexers=None, method=None, tolerance=None, drop=False, **selection).compute()
 
             x_coord, y_coord = bounds.keys()
-            npoints = sel_xds.sizes[x_coord] * sel_xds.sizes[y_coord]
-            counter = 0
-
-            for y in sel_xds[y_coord].values:
-                for x in sel_xds[x_coord].values:
-                    position = {x_coord: x, y_coord: y}
-                    points.append(_locate_point(sel_xds, position, vis_axis))
-                    counter += 1
-                    if counter == 100:
-                        break
-                if counter == 100:
-                    break
+            dims = (y_coord, x_coord)
+            shape = (sel_xds.sizes[y_coord], sel_xds.sizes[x_coord])
+            npoints = shape[0] * shape[1]
+
+            values, units = _get_location_arrays(sel_xds, dims, shape)
+            values = {name: value.ravel() for name, value in values.items()}
+            if 'VISIBILITY' in values:
+                values[vis_axis.upper()] = values.pop('VISIBILITY')
+
+            # List position first
+            columns = _get_location_columns(values, units, [x_coord, y_coord] + [name for name in values if name not in dims])
         except KeyError:
-            pass
-    return npoints, points
+            npoints = 0
+            columns = {}
+    return npoints, pd.DataFrame(columns)
+
+def _get_location_columns(values, units, names):
+    ''' Return dict of formatted values by name for location value arrays in names order,
+        listing indexed coordinate int value with str value '''
+    columns = {}
+    for name in names:
+        if name in INDEX_COORDS.values():
+            continue
+        if name in INDEX_COORDS and INDEX_COORDS[name] in values and np.issubdtype(values[name].dtype, np.integer):
+            columns[name] = pd.Series(values[INDEX_COORDS[name]]).astype(str) + \
+                " (" + pd.Series(values[name]).astype(str) + ")" # append name to index
+        else:
+            columns[name] = _format_location_values(name, values[name], units.get(name, ''))
+    return columns
+
+def _get_location_arrays(sel_xds, dims, shape):
+    ''' Return coord and data_var values for each point in plot data as arrays with shape of (y, x) dims.
+        Arrays are broadcast views of the xds values, so coordinates are not copied for each point.
+            sel_xds (Xarray Dataset): plot data, in memory
+            dims (tuple): (y, x) dimensions
+            shape (tuple): (y, x) sizes
+        Returns:
+            values (dict): {name: array} for each location item
+            units (dict): {name: unit} for each value
+    '''
+    values = {}
+    units = {}
+    for coord in sel_xds.coords:
+        if coord == 'uvw_label' or ('baseline_antenna' in coord and 'baseline_name' in sel_xds.coords):
+            continue
+        values[coord] = _get_broadcast_values(sel_xds[coord], dims, shape)
+        units[coord] = _get_xda_unit(sel_xds[coord])
+    for data_var in sel_xds.data_vars:
+        if 'TIME_CENTROID' in data_var:
+            continue
+        unit = _get_xda_unit(sel_xds[data_var])
+        if data_var == 'UVW':
+            for i, name in enumerate(['U', 'V', 'W']):
+                values[name] = _get_broadcast_values(sel_xds[data_var].isel(uvw_label=i), dims, shape)
+                units[name] = unit
+        else:
+            values[data_var] = _get_broadcast_values(sel_xds[data_var], dims, shape)
+            units[data_var] = unit
+    return values, units
+
+def _get_broadcast_values(xda, dims, shape):
+    ''' Return values of xda broadcast to shape of dims '''
+    xda_values = xda.transpose(*[dim for dim in dims if dim in xda.dims]).values
+    expand = tuple(slice(None) if dim in xda.dims else np.newaxis for dim in dims)
+    return np.broadcast_to(xda_values[expand], shape)
 
 def _get_point_location(xds, position, vis_axis):
     ''' Select plot data xds with point x, y position, and return coord and data_var values describing the location.
@@ -210,18 +350,20 @@ def _get_xda_val_unit(xda):
     if isinstance(value, np.ndarray) and value.size == 1:
         value = value.item()
 
-    # Unit
+    return value, _get_xda_unit(xda)
+
+def _get_xda_unit(xda):
+    ''' Return unit of xda, or empty string if none '''
     try:
         unit = xda.attrs['units']
         unit = unit[0] if (isinstance(unit, list) and len(unit) == 1) else unit
         unit = '' if unit == 'unkown' else unit
     except KeyError:
         unit = ''
+    return unit
 
-    return value, unit
-
-def _get_location_text(name, value, units):
-    ''' Format value and unit (if any) and return Panel StaticText '''
+def _format_location_value(name, value, units):
+    ''' Return value and unit (if any) formatted for its type '''
     if not isinstance(value, str):
         # Format numeric and datetime values
         if name == "FLAG":
@@ -237,7 +379,27 @@ def _get_location_text(name, value, units):
             value = to_datetime(np.datetime_as_string(value)).strftime(TIME_FORMAT)
             units.pop(name) # no unit for datetime string
     unit = units[name] if name in units else ""
-    return pn.widgets.StaticText(name=name, value=f"{value} {unit}")
+    return f"{value} {unit}"
+
+def _format_location_values(name, values, unit):
+    ''' Format array of values and unit (if any) as in _format_location_value, and return pandas Series of str '''
+    if np.issubdtype(values.dtype, np.datetime64):
+        # No unit for datetime string
+        return pd.Series(to_datetime(values).strftime(TIME_FORMAT))
+
+    if name == "FLAG":
+        if np.issubdtype(values.dtype, np.floating):
+            formatted = np.where(np.isnan(values), "nan", np.nan_to_num(values).astype(int).astype(str))
+        else:
+            formatted = values.astype(int).astype(str)
+    elif np.issubdtype(values.dtype, np.floating):
+        formatted = np.where(values < 1e6, np.char.mod("%.4f", values), np.char.mod("%.4e", values))
+        formatted = np.where(np.isnan(values), "nan", formatted)
+    else:
+        formatted = values.astype(str)
+
+    formatted = pd.Series(formatted)
+    return formatted + " " + unit if unit else formatted
 
 def _layout_point_location(text_list):
     ''' Layout list of StaticText in row of columns containing 3 rows '''
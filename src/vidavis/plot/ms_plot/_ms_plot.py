@@ -2,8 +2,10 @@
 Base class for ms plots
 '''
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as wait_futures
 import os
 import logging
+import queue
 import threading
 import time
 
@@ -13,11 +15,14 @@ import hvplot
 import holoviews as hv
 import numpy as np
 import panel as pn
+from panel.io.state import set_curdoc
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from toolviper.utils.logger import setup_logger
 
 from vidavis.data.measurement_set._ms_data import MsData
-from vidavis.plot.ms_plot._locate_points import get_locate_value, get_new_data, update_cursor_location, update_points_location, update_boxes_location
+from vidavis.plot.ms_plot._locate_points import LocateIndex, get_locate_value, get_new_data, update_cursor_location, update_points_location, update_boxes_location
+from vidavis.plot.ms_plot._ms_plot_constants import CURSOR_LOCATE_RATE
 from vidavis.toolbox import AppContext
 
 class MsPlot:
@@ -25,12 +30,16 @@ class MsPlot:
     ''' Base class for MS plots with common functionality '''
 
 # pylint: disable=too-many-arguments, too-many-positional-arguments
-    def __init__(self, ms=None, log_level="info", log_to_file=False, show_gui=False, app_name="MsPlot"):
+    def __init__(self, ms=None, log_level="info", log_to_file=False, show_gui=False, app_name="MsPlot", chunk_axes=None):
         if not ms and not show_gui:
             raise RuntimeError("Must provide ms/zarr path if gui not shown.")
 
-        # Set logger: use toolviper logger else casalog else python logger
-        self._logger = setup_logger(app_name, log_to_term=True, log_to_file=log_to_file, log_file=app_name.lower(), log_level=log_level.upper())
+        # Set logger: use toolviper logger else casalog else python logger.
+        # Sessions of a gui server share the logger set up by the server.
+        if self._is_server_session():
+            self._logger = logging.getLogger(app_name)
+        else:
+            self._logger = setup_logger(app_name, log_to_term=True, log_to_file=log_to_file, log_file=app_name.lower(), log_level=log_level.upper())
 
         # For removing stdout logging when using locate
         self._stdout_handler = None
@@ -42,6 +51,7 @@ class MsPlot:
         # Save parameters; ms set below
         self._show_gui = show_gui
         self._app_name = app_name
+        self._chunk_axes = chunk_axes # for MSv2 conversion
 
         # Set up temp dir for output html files
         self._app_context = AppContext(app_name)
@@ -61,8 +71,10 @@ class MsPlot:
             self._toast = None # for destroy() with new plot or new notification
 
             self._gui_selection = {}
+            self._last_gui_selection = None # selection applied to ms data
             self._last_plot_inputs = None
             self._last_style_inputs = None
+            self._last_raster_data = None # for plot update with changed render inputs only
             self._last_gui_plot = None # return value for updating plot inputs from GUI
 
         self._panel = None
@@ -70,6 +82,11 @@ class MsPlot:
 
         # Check which points changed for locate
         self._plot_axes = None # for normalizing points
+        self._locate_index = None # for cursor location, built once per plot data
+        self._cursor_interval = 1.0 / CURSOR_LOCATE_RATE # minimum seconds between cursor location updates
+        self._cursor_position = None # latest cursor position
+        self._last_cursor_time = 0.0
+        self._cursor_pending = False # whether timeout is set to show latest cursor position
         self._last_points = None
         self._last_boxes = None
 
@@ -120,6 +137,34 @@ class MsPlot:
         self._logger.error("Error: MS path has not been set")
         return None
 
+    def chunk_report(self, data_group='base', plot_axes=None):
+        ''' Returns pandas DataFrame reporting zarr chunks read for a raster plot of each plot axes, and read amplification
+            (bytes read / bytes plotted) when non-plot dimensions are selected.
+                data_group (str): data group of correlated data.
+                plot_axes (None, list): list of (x_axis, y_axis). Default None reports ('baseline', 'time'),
+                    ('frequency', 'time'), and ('baseline', 'frequency').
+        '''
+        if self._ms_data:
+            return self._ms_data.get_chunk_report(data_group, plot_axes)
+        self._logger.error("Error: MS path has not been set")
+        return None
+
+    def rechunk(self, out_path=None, plot_axes=('baseline', 'time')):
+        ''' Write copy of zarr file with chunks for raster plots of plot axes. Returns output path.
+                out_path (None, str): path of output zarr file. Default None writes {ms name}_{x_axis}_{y_axis}.ps.zarr
+                    in the same directory as the zarr file.
+                plot_axes (tuple): (x_axis, y_axis) of raster plots.
+        '''
+        if not self._ms_data:
+            self._logger.error("Error: MS path has not been set")
+            return None
+
+        if not out_path:
+            out_path = os.path.join(os.path.dirname(self._ms_info['ms']),
+                f"{self._ms_info['basename']}_{plot_axes[0]}_{plot_axes[1]}.ps.zarr")
+        self._ms_data.rechunk(out_path, plot_axes)
+        return out_path
+
     def plot_antennas(self, label_antennas=False):
         ''' Plot antenna positions.
                 label_antennas (bool): label positions with antenna names.
@@ -139,6 +184,13 @@ class MsPlot:
         else:
             self._logger.error("Error: MS path has not been set")
 
+    def set_locate_rate(self, rate=CURSOR_LOCATE_RATE):
+        ''' Set maximum number of cursor location updates per second. Cursor positions between updates are skipped,
+            and the latest position is shown when the interval ends. '''
+        if rate <= 0:
+            raise ValueError("Cursor locate rate must be greater than zero.")
+        self._cursor_interval = 1.0 / rate
+
     def clear_plots(self):
         ''' Clear plot list '''
         self._plots.clear()
@@ -198,8 +250,9 @@ class MsPlot:
             self._panel.append(('Locate Points', pn.Feed(height_policy='max')))
             self._panel.append(('Locate Box', pn.Feed(height_policy='max')))
 
-            # Compute coordinate values for locate
+            # Compute coordinate values and cursor index for locate
             self._compute_plot_metadata(self._plot_data)
+            self._get_locate_index()
 
             # return value for locate callback
             self._last_plot = plot
@@ -220,6 +273,7 @@ class MsPlot:
             If subplots is a grid, the layout plot will be saved to a single file.
             If subplots is a single plot, iteration plots will be saved individually,
                 with a plot index appended to the filename: {filename}_{index}.{ext}.
+                PNG and SVG iteration plots are exported in parallel by a pool of headless browsers.
         '''
         if not self._plots:
             raise RuntimeError("No plot to save.  Run plot() to create plot.")
@@ -239,10 +293,8 @@ class MsPlot:
             # Save iterated plots individually, with index appended to filename
             iter_range = self._plot_inputs.get_input('iter_range')
             plot_idx = 0 if iter_range is None else iter_range[0]
-            for plot in self._plots:
-                exportname = f"{name}_{plot_idx}{ext}"
-                self._save_plot(plot, exportname, fmt)
-                plot_idx += 1
+            exportnames = [f"{name}_{plot_idx + i}{ext}" for i in range(len(self._plots))]
+            self._save_plots(self._plots, exportnames, fmt)
         else:
             self._save_plot(plot, filename, fmt)
         self._logger.debug("Save elapsed time: %.2fs.", time.time() - start_time)
@@ -288,20 +340,75 @@ class MsPlot:
                 save(fig, filename)
             elif fmt in ['png', 'svg']:
                 # Use Chrome web driver
-                service = webdriver.ChromeService()
-                options = webdriver.ChromeOptions()
-                options.add_argument('--headless')
-                options.add_argument('--no-sandbox')
-
-                with webdriver.Chrome(service=service, options=options) as driver:
-                    if fmt=='png':
-                        export_png(fig, filename=filename, webdriver=driver)
-                    elif fmt=='svg':
-                        export_svg(fig, filename=filename, webdriver=driver)
+                with _get_webdriver() as driver:
+                    _export_figure(fig, filename, fmt, driver)
             else:
                 raise ValueError(f"Invalid fmt or filename extension {fmt} for save()") from exc
         self._logger.info("Saved plot to %s.", filename)
 
+    def _save_plots(self, plots, filenames, fmt):
+        ''' Save each plot to filename. PNG and SVG plots are exported in parallel by a pool of Chrome web drivers,
+            each started once for all plots, rather than one web driver per plot. '''
+        if fmt not in ['png', 'svg'] or len(plots) == 1:
+            for plot, filename in zip(plots, filenames):
+                self._save_plot(plot, filename, fmt)
+            return
+
+        saved = set() # indices of exported plots
+        try:
+            self._export_plots(plots, filenames, fmt, saved)
+        except WebDriverException as exc:
+            # Cannot start Chrome, save remaining plots individually
+            self._logger.debug("Batch export failed (%s), saving %d plots individually.", str(exc).strip(),
+                len(plots) - len(saved))
+            for idx, (plot, filename) in enumerate(zip(plots, filenames)):
+                if idx not in saved:
+                    self._save_plot(plot, filename, fmt)
+
+# pylint: disable=too-many-locals
+    def _export_plots(self, plots, filenames, fmt, saved):
+        ''' Export each plot to filename in parallel using a pool of Chrome web drivers, and add its index to saved set.
+            Figures are rendered as drivers become free, so at most two figures per driver are held in memory. '''
+        num_drivers = min(len(plots), os.cpu_count() or 1)
+        drivers = [] # started drivers, to quit when done
+        idle_drivers = queue.Queue()
+
+        def export_figure(idx, fig, filename):
+            # Use idle driver or start new one, at most one per thread
+            try:
+                driver = idle_drivers.get_nowait()
+            except queue.Empty:
+                driver = _get_webdriver()
+                drivers.append(driver)
+            try:
+                _export_figure(fig, filename, fmt, driver)
+            finally:
+                idle_drivers.put(driver)
+            saved.add(idx)
+            self._logger.info("Saved plot to %s.", filename)
+
+        try:
+            with ThreadPoolExecutor(max_workers=num_drivers) as executor:
+                # Render Bokeh figures in this thread when an export is done, export in driver threads
+                pending = set()
+                for idx, (plot, filename) in enumerate(zip(plots, filenames)):
+                    if len(pending) >= 2 * num_drivers:
+                        done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    fig = hv.render(plot.opts(toolbar=None, clone=True))
+                    pending.add(executor.submit(export_figure, idx, fig, filename))
+                for future in pending:
+                    future.result()
+        finally:
+            for driver in drivers:
+                driver.quit()
+# pylint: enable=too-many-locals
+
+    def _is_server_session(self):
+        ''' Return whether object is created for a browser session of a Panel server '''
+        return bool(pn.state.curdoc and pn.state.curdoc.session_context)
+
     def _set_ms(self, ms_path):
         ''' Set MsData and update ms info for input ms filepath (MSv2 or zarr), if set.
             Return whether ms changed (false if ms_path is None, not set yet), even if error. '''
@@ -312,14 +419,7 @@ class MsPlot:
 
         try:
             # Set new MS data
-            self._ms_data = MsData(ms_path, self._logger)
-            data_path = self._ms_data.get_path()
-            self._ms_info['ms'] = data_path
-            root, ext = os.path.splitext(os.path.basename(data_path))
-            while ext != '':
-                root, ext = os.path.splitext(root)
-            self._ms_info['basename'] = root
-            self._ms_info['data_dims'] = self._ms_data.get_data_dimensions()
+            self._set_ms_data(self._open_ms(ms_path))
         except RuntimeError as e:
             ms_error = str(e)
             self._ms_data = None
@@ -327,6 +427,21 @@ class MsPlot:
             self._notify(ms_error, 'error', 0)
         return True
 
+    def _open_ms(self, ms_path):
+        ''' Return MsData for input ms filepath (MSv2 or zarr). Converts MSv2 to zarr if needed. '''
+        return MsData(ms_path, self._logger, self._chunk_axes)
+
+    def _set_ms_data(self, ms_data):
+        ''' Set MsData and update ms info '''
+        self._ms_data = ms_data
+        data_path = ms_data.get_path()
+        self._ms_info['ms'] = data_path
+        root, ext = os.path.splitext(os.path.basename(data_path))
+        while ext != '':
+            root, ext = os.path.splitext(root)
+        self._ms_info['basename'] = root
+        self._ms_info['data_dims'] = ms_data.get_data_dimensions()
+
     def _notify(self, message, level, duration=3000):
         ''' Log message. If show_gui, notify user with toast for duration in ms.
             Zero duration must be dismissed. '''
@@ -378,12 +493,9 @@ class MsPlot:
     def _fill_inputs_column(self, inputs_tab_column):
         ''' Format plot inputs and list in Panel column '''
         if self._plot_params:
-            inputs_tab_column.clear()
             plot_params = sorted([f"{key}={value}" for key, value in self._plot_params.items()])
-            for param in plot_params:
-                str_pane = pn.pane.Str(param)
-                str_pane.margin = (0, 10)
-                inputs_tab_column.append(str_pane)
+            # Replace objects in one update; each append updates the whole document when shown
+            inputs_tab_column.objects = [pn.pane.Str(param, margin=(0, 10)) for param in plot_params]
 
     def _compute_plot_metadata(self, xds):
         ''' Compute coordinate dask arrays to numpy arrays in memory '''
@@ -435,8 +547,14 @@ class MsPlot:
             self._plot_axes = (x_axis, y_axis, vis_axis)
         return self._plot_axes
 
+    def _get_locate_index(self):
+        ''' Return LocateIndex for plot data, building it for new plot data '''
+        if self._locate_index is None and self._plot_data:
+            self._locate_index = LocateIndex(self._plot_data, self._get_plot_axes())
+        return self._locate_index
+
     def _locate_cursor(self, x, y):
-        ''' Show location from cursor position in cursor locate box '''
+        ''' Show location from cursor position in cursor locate box, at most once per cursor interval '''
         # Locate does not change plot
         # Callback must return holoviews Element even if empty
         points = hv.Points([])
@@ -444,14 +562,27 @@ class MsPlot:
         if not self._plot_data or (not x and not y):
             return points
 
-        # Normalize cursor to plot data values
-        plot_axes = self._get_plot_axes()
-        x = get_locate_value(self._plot_data, plot_axes[0], x)
-        y = get_locate_value(self._plot_data, plot_axes[1], y)
-        cursor = (x, y)
-        update_cursor_location(cursor, plot_axes, self._plot_data, self._panel[0][1])
+        self._cursor_position = (x, y)
+        wait = self._last_cursor_time + self._cursor_interval - time.monotonic()
+        if wait <= 0:
+            self._show_cursor_location()
+        elif not self._cursor_pending and pn.state.curdoc:
+            # Show latest position when interval ends
+            self._cursor_pending = True
+            doc = pn.state.curdoc
+            doc.add_timeout_callback(lambda: self._show_cursor_location(doc), int(wait * 1000))
         return points
 
+    def _show_cursor_location(self, doc=None):
+        ''' Show location of latest cursor position in cursor locate box '''
+        self._cursor_pending = False
+        self._last_cursor_time = time.monotonic()
+        locate_index = self._get_locate_index()
+        if locate_index is None or not self._cursor_position:
+            return
+        with set_curdoc(doc or pn.state.curdoc):
+            update_cursor_location(self._cursor_position, locate_index, self._panel[0][1])
+
     def _locate_points(self, data):
         ''' Show points locations from point_draw tool '''
         # Locate does not change plot
@@ -526,3 +657,18 @@ class MsPlot:
         for message in messages:
             self._logger.info(message)
         self._logger.addHandler(self._stdout_handler)
+
+def _get_webdriver():
+    ''' Return headless Chrome web driver for export '''
+    service = webdriver.ChromeService()
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    return webdriver.Chrome(service=service, options=options)
+
+def _export_figure(fig, filename, fmt, driver):
+    ''' Export Bokeh figure to png or svg file using web driver '''
+    if fmt=='png':
+        export_png(fig, filename=filename, webdriver=driver)
+    elif fmt=='svg':
+        export_svg(fig, filename=filename, webdriver=driver)
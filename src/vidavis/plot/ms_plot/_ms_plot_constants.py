@@ -1,5 +1,7 @@
 ''' Define constants used for plotting MeasurementSets '''
 
+import os
+
 TIME_FORMAT = "%d-%b-%Y %H:%M:%S"
 
 SPECTRUM_AXIS_OPTIONS = ['amp', 'real']
@@ -30,5 +32,48 @@ MS_SELECTION_OPTIONS = {
 
 AGGREGATOR_OPTIONS = ['None', 'max', 'mean', 'median', 'min', 'std', 'sum', 'var']
 
+RASTER_REDUCTION_OPTIONS = ['max', 'mean', 'first']
+
+# Multi-resolution pyramid: reduce levels to this size, and screen size (width, height) used until plot size is known
+PYRAMID_MIN_SIZE = 256
+PYRAMID_SCREEN_SIZE = (1000, 1000)
+
+# GUI label to color_mode
+COLOR_MODE_OPTIONS = {
+    'No color range': None,
+    'Auto color range': 'auto',
+    'Fast auto color range': 'auto_fast',
+    'Manual color range': 'manual'
+}
+
+# Color limits for 'auto_fast' color_mode: percentiles estimated from fraction of data chunks
+AUTO_FAST_PERCENTILES = (1.0, 99.0)
+AUTO_FAST_SAMPLE_FRACTION = 0.1
+
+# Iteration plots compute raster data for this many iteration values ahead of the plot being created.
+# Each plane is computed with the threaded dask scheduler using all cores, so prefetch depth only needs to overlap
+# computation with plot creation; it grows slowly with cores and is bounded to limit planes in memory.
+ITER_PREFETCH_DEPTH = max(2, min(4, (os.cpu_count() or 1) // 8))
+
+# GUI plot requests wait this many seconds for a newer request before computing
+PLOT_DEBOUNCE_DELAY = 0.3
+
+# GUI plot update: inputs set by plotting are not compared for changes,
+# and changes to render inputs only replot the last raster data
+GUI_DERIVED_INPUTS = ['self', '__class__', 'clear_plots', 'data_dims', 'selection', 'data_group', 'auto_spw', 'dim_selection',
+    'auto_color_range', 'locate_data']
+GUI_RENDER_INPUTS = ['title', 'color_mode', 'color_range', 'rasterize', 'pyramid', 'raster_reduction', 'compact']
+
+# Compact transport: maximum size of regular image grid relative to data size (gaps are filled with NaN),
+# and tolerance of coordinate positions on the grid as a fraction of grid step
+COMPACT_MAX_FILL = 2.0
+COMPACT_GRID_TOLERANCE = 0.01
+
+# Rows per page of box locate table
+LOCATE_PAGE_SIZE = 100
+
+# Default maximum cursor location updates per second
+CURSOR_LOCATE_RATE = 10
+
 DEFAULT_UNFLAGGED_CMAP = "Viridis"
 DEFAULT_FLAGGED_CMAP = "Reds"
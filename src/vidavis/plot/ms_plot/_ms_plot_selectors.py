@@ -5,7 +5,8 @@ Create panel widgets for various functions
 import panel as pn
 
 from vidavis.bokeh._palette import available_palettes
-from vidavis.plot.ms_plot._ms_plot_constants import VIS_AXIS_OPTIONS, AGGREGATOR_OPTIONS, PS_SELECTION_OPTIONS, MS_SELECTION_OPTIONS, DEFAULT_UNFLAGGED_CMAP, DEFAULT_FLAGGED_CMAP
+from vidavis.plot.ms_plot._ms_plot_constants import (VIS_AXIS_OPTIONS, AGGREGATOR_OPTIONS, PS_SELECTION_OPTIONS,
+    MS_SELECTION_OPTIONS, COLOR_MODE_OPTIONS, RASTER_REDUCTION_OPTIONS, DEFAULT_UNFLAGGED_CMAP, DEFAULT_FLAGGED_CMAP)
 
 def file_selector(callbacks, ms):
     ''' Return a layout for file selection with input description and start directory.
@@ -43,9 +44,9 @@ def file_selector(callbacks, ms):
         width_policy='min',
     )
 
-def style_selector(style_callback, color_range_callback):
+def style_selector(style_callback, color_range_callback, rasterize_callback):
     ''' Return a layout for style parameters.
-        Currently supports colormaps, colorbar, and color limits.
+        Currently supports colormaps, colorbar, color limits, server-side rasterization or pyramid, and compact transport.
     '''
     cmaps = available_palettes()
 
@@ -76,7 +77,7 @@ def style_selector(style_callback, color_range_callback):
     select_style = pn.bind(style_callback, cmap_selector, flagged_cmap_selector, colorbar_checkbox, flagged_colorbar_checkbox)
 
     color_mode_selector = pn.widgets.RadioBoxGroup(
-        options=["No color range", "Auto color range", "Manual color range"],
+        options=list(COLOR_MODE_OPTIONS),
     )
 
     color_range_slider = pn.widgets.RangeSlider(
@@ -101,9 +102,44 @@ def style_selector(style_callback, color_range_callback):
             color_range_slider,  # [1]
             select_color_range,  # [2]
         ),
+        _rasterize_selector(rasterize_callback), # [3]
         width_policy='min',
     )
 
+def _rasterize_selector(rasterize_callback):
+    ''' Return a row of selectors for server-side rasterization or pyramid, and compact transport '''
+    rasterize_checkbox = pn.widgets.Checkbox(
+        name="Rasterize on server (for large data)",
+        value=False,
+    )
+
+    pyramid_checkbox = pn.widgets.Checkbox(
+        name="Multi-resolution zoom",
+        value=False,
+    )
+
+    raster_reduction_selector = pn.widgets.Select(
+        name="Rasterize reduction",
+        options=RASTER_REDUCTION_OPTIONS,
+        sizing_mode='scale_width',
+    )
+
+    compact_checkbox = pn.widgets.Checkbox(
+        name="Compact transport",
+        value=False,
+    )
+
+    select_rasterize = pn.bind(rasterize_callback, rasterize_checkbox, pyramid_checkbox, raster_reduction_selector,
+        compact_checkbox)
+
+    return pn.Row(
+        rasterize_checkbox,        # [0]
+        pyramid_checkbox,          # [1]
+        raster_reduction_selector, # [2]
+        compact_checkbox,          # [3]
+        select_rasterize,          # [4]
+    )
+
 def axis_selector(plot_info, include_vis, callback):
     ''' Return layout of selectors for x-axis, y-axis, and vis-axis '''
     axis_options = plot_info['data_dims'] if 'data_dims' in plot_info else []
@@ -10,6 +10,13 @@ def inputs_changed(plot_inputs, last_plot_inputs):
             return True
     return False
 
+def get_changed_inputs(plot_inputs, last_plot_inputs, ignore=None):
+    ''' Return list of input names whose values changed from last inputs, excluding names in ignore list '''
+    ignore = ignore if ignore else []
+    if not last_plot_inputs:
+        return [key for key in plot_inputs if key not in ignore]
+    return [key for key, val in plot_inputs.items() if key not in ignore and not _values_equal(val, last_plot_inputs.get(key))]
+
 def _values_equal(val1, val2):
     ''' Test if values are set and equal, or not set (cannot compare value with None) '''
     if val1 is not None and val2 is not None: # both set
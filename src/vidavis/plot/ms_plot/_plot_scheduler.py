@@ -0,0 +1,83 @@
+'''
+Schedule GUI plot computation in a worker thread, keeping only the latest plot request.
+'''
+
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from contextlib import nullcontext
+import threading
+
+from dask.callbacks import Callback
+
+from vidavis.plot.ms_plot._ms_plot_constants import PLOT_DEBOUNCE_DELAY
+
+class PlotCancelled(Exception):
+    ''' Plot request was superseded by a newer request '''
+
+class PlotScheduler:
+    '''
+    Run plot requests one at a time in a worker thread.
+    A request waits for the debounce delay before starting, and a newer request cancels it:
+    a waiting request does not start, and dask computations of a running request stop at the next task.
+    '''
+
+    def __init__(self, logger, delay=PLOT_DEBOUNCE_DELAY):
+        self._logger = logger
+        self._delay = delay
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._cancel_event = None # for latest request
+        self._future = None # for latest request
+
+    def submit(self, plot_function):
+        ''' Cancel previous request and schedule plot_function(cancel_event).
+            plot_function must not show its plot if cancel_event is set. Returns future. '''
+        cancel_event = threading.Event()
+        with self._lock:
+            if self._cancel_event:
+                self._cancel_event.set()
+            self._cancel_event = cancel_event
+            self._future = self._executor.submit(self._run, plot_function, cancel_event)
+            return self._future
+
+    def cancel(self, wait=False):
+        ''' Cancel latest request. If wait, return when its plot function has stopped. '''
+        with self._lock:
+            if self._cancel_event:
+                self._cancel_event.set()
+            future = self._future
+        if wait and future:
+            wait_futures([future])
+
+    def _run(self, plot_function, cancel_event):
+        ''' Wait for debounce delay then run plot_function, unless cancelled '''
+        if cancel_event.wait(self._delay):
+            self._logger.debug("Plot request superseded before start")
+            return
+        try:
+            with _CancelCallback(cancel_event, threading.get_ident()):
+                plot_function(cancel_event)
+        except PlotCancelled:
+            self._logger.debug("Plot request superseded, computation cancelled")
+
+def cancellable_compute(cancel_event):
+    ''' Return context in which dask computations in the calling thread stop when cancel_event is set,
+        for computations of a plot request in threads other than the plot worker thread. '''
+    if cancel_event is None:
+        return nullcontext()
+    return _CancelCallback(cancel_event, threading.get_ident())
+
+class _CancelCallback(Callback):
+    ''' Dask callback which stops computation in the thread which created it (plot worker or prefetch thread)
+        when plot request is cancelled. '''
+
+    def __init__(self, cancel_event, thread_id):
+        super().__init__(pretask=self._check_cancelled)
+        self._cancel_event = cancel_event
+        self._thread_id = thread_id
+
+# pylint: disable=unused-argument
+    def _check_cancelled(self, key, dask, state):
+        ''' Called before each task by the local scheduler, in the thread which called compute '''
+        if self._cancel_event.is_set() and threading.get_ident() == self._thread_id:
+            raise PlotCancelled()
+# pylint: enable=unused-argument
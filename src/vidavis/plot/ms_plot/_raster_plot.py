@@ -7,9 +7,14 @@ Class to create a raster plot of visibility/spectrum data using plot parameters.
 import hvplot.xarray
 import hvplot.pandas
 # pylint: enable=unused-import
+import holoviews as hv
+import numpy as np
+import xarray as xr
 
 from vidavis.data.measurement_set.processing_set._ps_coords import set_index_coordinates
 from vidavis.data.measurement_set.processing_set._xds_data import get_correlated_data
+from vidavis.plot.ms_plot._ms_plot_constants import COMPACT_GRID_TOLERANCE, COMPACT_MAX_FILL, PYRAMID_MIN_SIZE, PYRAMID_SCREEN_SIZE
+from vidavis.plot.ms_plot._raster_pyramid import RasterPyramid
 from vidavis.plot.ms_plot._time_ticks import get_time_formatter
 from vidavis.plot.ms_plot._xds_plot_axes import get_axis_labels, get_vis_axis_labels, get_coordinate_labels
 
@@ -22,6 +27,7 @@ class RasterPlot:
     def __init__(self):
         self._plot_params = {'data': {}, 'plot': {'params': False}, 'style': {}}
         self._spw_color_limits = {}
+        self._last_planes = {} # last plot data and its plot planes, reused when only style or plot params change
         self.set_style_params() # use defaults unless set externally
 
     def set_style_params(self, unflagged_cmap='Viridis', flagged_cmap='Reds',  show_colorbar=True, show_flagged_colorbar=True):
@@ -58,10 +64,16 @@ class RasterPlot:
         self._plot_params['data']['correlated_data'] = get_correlated_data(data, data_group)
         self._plot_params['data']['aggregator'] = plot_inputs['aggregator']
 
+        # Server-side rasterization or multi-resolution pyramid to screen resolution
+        self._plot_params['plot']['rasterize'] = plot_inputs['rasterize'] if 'rasterize' in plot_inputs else False
+        self._plot_params['plot']['pyramid'] = plot_inputs['pyramid'] if 'pyramid' in plot_inputs else False
+        self._plot_params['plot']['raster_reduction'] = plot_inputs['raster_reduction'] if 'raster_reduction' in plot_inputs else 'max'
+        self._plot_params['plot']['compact'] = plot_inputs['compact'] if 'compact' in plot_inputs else False
+
         color_mode = plot_inputs['color_mode']
         if color_mode == 'manual':
             self._plot_params['plot']['color_limits'] = plot_inputs['color_range']
-        elif color_mode == 'auto':
+        elif color_mode in ['auto', 'auto_fast']:
             self._plot_params['plot']['color_limits'] = plot_inputs['auto_color_range']
         else:
             self._plot_params['plot']['color_limits'] = None
@@ -102,15 +114,7 @@ class RasterPlot:
         if data_params['aggregator']:
             xda_name = "_".join([data_params['aggregator'], xda_name])
 
-        # Set plot axes to numeric coordinates if needed
-        xds = set_index_coordinates(data, (axis_labels['x']['axis'], axis_labels['y']['axis']))
-        xda = xds[data_params['correlated_data']].rename(xda_name)
-
-        # Calculate data range for flagged and unflagged data for color limits
-        unflagged_xda = xda.where(xds.FLAG == 0.0)
-        flagged_xda = xda.where(xds.FLAG == 1.0).rename("flagged " + xda_name)
-        unflagged_data_range = (unflagged_xda.min().values.item(), unflagged_xda.max().values.item())
-        flagged_data_range = (flagged_xda.min().values.item(), flagged_xda.max().values.item())
+        xda, flagged_xda, unflagged_data_range, flagged_data_range = self._get_plot_planes(data, xda_name)
         if is_gui: # update data range for colorbar
             self._plot_params['data']['data_range'] = unflagged_data_range
 
@@ -121,6 +125,33 @@ class RasterPlot:
         # Make Overlay plot
         return unflagged_plot.opts(tools=['hover']) * flagged_plot.opts(tools=[])
 
+    def _get_plot_planes(self, data, xda_name):
+        ''' Return unflagged and flagged DataArrays to plot and their data ranges.
+            Planes for the last plot data are reused, so replotting with new style or plot params skips data work. '''
+        axis_labels = self._plot_params['plot']['axis_labels']
+        plot_axes = (axis_labels['x']['axis'], axis_labels['y']['axis'])
+        correlated_data = self._plot_params['data']['correlated_data']
+        compact = self._plot_params['plot']['compact']
+        planes_key = (plot_axes, correlated_data, xda_name, compact)
+        if self._last_planes.get('data') is data and self._last_planes.get('key') == planes_key:
+            return self._last_planes['planes']
+
+        # Set plot axes to numeric coordinates if needed
+        xds = set_index_coordinates(data, plot_axes)
+        xda = xds[correlated_data].rename(xda_name)
+        if compact and xda.dtype.itemsize > 4:
+            xda = xda.astype(np.float32)
+
+        # Calculate data range for flagged and unflagged data for color limits
+        unflagged_xda = xda.where(xds.FLAG == 0.0)
+        flagged_xda = xda.where(xds.FLAG == 1.0).rename("flagged " + xda_name)
+        unflagged_data_range = (unflagged_xda.min().values.item(), unflagged_xda.max().values.item())
+        flagged_data_range = (flagged_xda.min().values.item(), flagged_xda.max().values.item())
+
+        planes = (xda, flagged_xda, unflagged_data_range, flagged_data_range)
+        self._last_planes = {'data': data, 'key': planes_key, 'planes': planes}
+        return planes
+
     def _get_plot_title(self, data, plot_inputs, ms_name):
         ''' Form string containing ms name and selected values using data (xArray Dataset) '''
         title = f"{ms_name}\n"
@@ -203,23 +234,21 @@ class RasterPlot:
 
         if xda[x_axis].size > 1 and xda[y_axis].size > 1:
             # Raster 2D data
-            plot = xda.hvplot.quadmesh(
-                x_axis,
-                y_axis,
-                clim=c_lim,
-                cmap=colormap,
-                clabel=c_label,
-                title=self._plot_params['plot']['title'],
-                xlabel=axis_labels['x']['label'],
-                ylabel=axis_labels['y']['label'],
-                xformatter=x_formatter,
-                yformatter=y_formatter,
-                xticks=axis_labels['x']['ticks'],
-                yticks=axis_labels['y']['ticks'],
-                rot=45, # angle for x axis labels
-                colorbar=show_colorbar,
-                responsive=True, # resize to fill browser window
-            )
+            plot = self._plot_quadmesh(xda, x_axis, y_axis, is_flagged, {
+                'clim': c_lim,
+                'cmap': colormap,
+                'clabel': c_label,
+                'title': self._plot_params['plot']['title'],
+                'xlabel': axis_labels['x']['label'],
+                'ylabel': axis_labels['y']['label'],
+                'xformatter': x_formatter,
+                'yformatter': y_formatter,
+                'xticks': axis_labels['x']['ticks'],
+                'yticks': axis_labels['y']['ticks'],
+                'rot': 45, # angle for x axis labels
+                'colorbar': show_colorbar,
+                'responsive': True, # resize to fill browser window
+            })
         else:
             # Cannot raster 1D data, use scatter from pandas dataframe
             df = xda.to_dataframe().reset_index() # convert x and y axis from index to column
@@ -245,3 +274,96 @@ class RasterPlot:
         if show_colorbar and not is_flagged:
             plot = plot.opts(colorbar_position='left')
         return plot
+
+    def _plot_quadmesh(self, xda, x_axis, y_axis, is_flagged, quadmesh_kwargs):
+        ''' Return Quadmesh plot of raster 2D data, optionally re-aggregated by datashader or from pyramid to screen
+            resolution for each zoom/pan '''
+        rasterize = self._plot_params['plot']['rasterize']
+        quadmesh_kwargs['rasterize'] = rasterize
+        quadmesh_kwargs['aggregator'] = self._plot_params['plot']['raster_reduction'] if rasterize else None
+
+        if self._plot_params['plot']['pyramid']:
+            return self._plot_pyramid(xda, x_axis, y_axis, quadmesh_kwargs)
+        if self._plot_params['plot']['compact'] and not rasterize:
+            return self._plot_compact(xda, x_axis, y_axis, is_flagged, quadmesh_kwargs)
+        return xda.hvplot.quadmesh(x_axis, y_axis, **quadmesh_kwargs)
+
+    def _plot_pyramid(self, xda, x_axis, y_axis, quadmesh_kwargs):
+        ''' Return DynamicMap of Quadmesh plot using pyramid level closest to screen resolution for zoom/pan range '''
+        pyramid = RasterPyramid(xda, x_axis, y_axis, self._plot_params['plot']['raster_reduction'], PYRAMID_MIN_SIZE)
+
+        def plot_view(x_range, y_range, width, height, scale):
+            # plot size in pixels is None until shown
+            screen_size = (int((width or PYRAMID_SCREEN_SIZE[0]) * scale), int((height or PYRAMID_SCREEN_SIZE[1]) * scale))
+            xda_view = pyramid.get_view(x_range, y_range, screen_size)
+            return xda_view.hvplot.quadmesh(x_axis, y_axis, **quadmesh_kwargs)
+
+        return hv.DynamicMap(plot_view, streams=[hv.streams.RangeXY(), hv.streams.PlotSize()])
+
+    def _plot_compact(self, xda, x_axis, y_axis, is_flagged, quadmesh_kwargs):
+        ''' Return Image plot if x and y coordinates are on a regular grid, else Quadmesh plot.
+            An Image sends one array of values instead of the corners and value of each Quadmesh cell.
+            Flagged data is cropped to the region containing flagged values. '''
+        grid_xda = _get_grid_xda(xda, x_axis, y_axis)
+        if grid_xda is None:
+            return xda.hvplot.quadmesh(x_axis, y_axis, **quadmesh_kwargs)
+        if is_flagged:
+            grid_xda = _crop_to_data(grid_xda, x_axis, y_axis)
+        image_kwargs = {key: value for key, value in quadmesh_kwargs.items() if key not in ['rasterize', 'aggregator']}
+        return grid_xda.hvplot.image(x_axis, y_axis, **image_kwargs)
+
+def _get_grid_xda(xda, x_axis, y_axis):
+    ''' Return xda with x and y dimensions on regular grids, with NaN where the grid has no data (e.g. time gaps).
+        Returns None if coordinates are not on a regular grid, or the grid is larger than COMPACT_MAX_FILL times
+        the data size. '''
+    grids = {}
+    grid_size = 1
+    for axis in (y_axis, x_axis):
+        grid = _get_regular_grid(xda[axis].values)
+        if grid is None:
+            return None
+        grids[axis] = grid
+        grid_size *= grid[0].size
+    if grid_size > COMPACT_MAX_FILL * xda[x_axis].size * xda[y_axis].size:
+        return None
+
+    (y_grid, y_index), (x_grid, x_index) = grids[y_axis], grids[x_axis]
+    values = np.full((y_grid.size, x_grid.size), np.nan, dtype=np.result_type(xda.dtype, np.float32))
+    values[np.ix_(y_index, x_index)] = xda.transpose(y_axis, x_axis).values
+    return xr.DataArray(values, coords={y_axis: y_grid, x_axis: x_grid}, dims=(y_axis, x_axis), name=xda.name,
+        attrs=xda.attrs)
+
+def _get_regular_grid(values):
+    ''' Return (grid values, index of each value in grid) if monotonic values are on a regular grid with the smallest
+        step between values, else None. '''
+    if values.size < 2:
+        return None
+    is_datetime = np.issubdtype(values.dtype, np.datetime64)
+    numeric = values.astype('datetime64[ns]').astype(np.int64) if is_datetime else values.astype(float)
+
+    steps = np.diff(numeric)
+    if not ((steps > 0).all() or (steps < 0).all()):
+        return None
+    step = steps[np.argmin(np.abs(steps))]
+    position = (numeric - numeric[0]) / step
+    index = np.round(position).astype(int)
+    if np.abs(position - index).max() > COMPACT_GRID_TOLERANCE:
+        return None
+
+    grid = numeric[0] + np.arange(index[-1] + 1) * step
+    if is_datetime:
+        grid = grid.astype('datetime64[ns]')
+    return grid, index
+
+def _crop_to_data(xda, x_axis, y_axis):
+    ''' Return xda cropped to x and y range containing non-NaN values, at least 2x2 for image '''
+    has_data = xda.notnull().transpose(y_axis, x_axis).values
+    selection = {}
+    for axis, axis_has_data in zip((y_axis, x_axis), (has_data.any(axis=1), has_data.any(axis=0))):
+        data_index = np.flatnonzero(axis_has_data)
+        start, stop = (data_index[0], data_index[-1] + 1) if data_index.size else (0, 0)
+        if stop - start < 2:
+            start = max(min(start, axis_has_data.size - 2), 0)
+            stop = start + 2
+        selection[axis] = slice(start, stop)
+    return xda.isel(selection)
@@ -43,8 +43,8 @@ def get_plot_input_selectors(callbacks, plot_info):
     # Select MS
     file_selectors = file_selector(callbacks, plot_info['ms'])
 
-    # Select style - colormaps, colorbar, color limits
-    style_selectors = style_selector(callbacks['style'], callbacks['color'])
+    # Select style - colormaps, colorbar, color limits, rasterization
+    style_selectors = style_selector(callbacks['style'], callbacks['color'], callbacks['rasterize'])
 
     # Select x, y, and vis axis
     axis_selectors = axis_selector(plot_info, True, callbacks['axes'])
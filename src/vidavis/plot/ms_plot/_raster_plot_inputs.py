@@ -3,6 +3,7 @@ Class to check and hold inputs for raster plot.
 '''
 
 from vidavis.plot.ms_plot._check_raster_inputs import check_inputs
+from vidavis.plot.ms_plot._ms_plot_constants import COLOR_MODE_OPTIONS
 
 class RasterPlotInputs:
     '''
@@ -88,11 +89,16 @@ class RasterPlotInputs:
 
     def set_color_inputs(self, color_mode, color_range):
         ''' Set style params from gui '''
-        color_mode = color_mode.split()[0]
-        color_mode = None if color_mode == 'No' else color_mode
-        self.set_input('color_mode', color_mode)
+        self.set_input('color_mode', COLOR_MODE_OPTIONS[color_mode])
         self.set_input('color_range', color_range)
 
+    def set_rasterize_inputs(self, rasterize, pyramid, raster_reduction, compact):
+        ''' Set server-side rasterization, pyramid, and compact transport inputs from gui '''
+        self.set_input('rasterize', rasterize)
+        self.set_input('pyramid', pyramid)
+        self.set_input('raster_reduction', raster_reduction)
+        self.set_input('compact', compact)
+
     def set_axis_inputs(self, x_axis, y_axis, vis_axis):
         ''' Set plot axis inputs from gui '''
         self.set_input('x_axis', x_axis)
@@ -0,0 +1,71 @@
+'''
+Multi-resolution pyramid of a raster plane for zoom and pan at screen resolution.
+'''
+
+import numpy as np
+
+class RasterPyramid:
+    '''
+    Levels of a 2D xarray DataArray, each reduced 2x2 from the previous level until it fits the minimum size.
+    Zoomed views are selected from the coarsest level which still has screen resolution in the view range,
+    so that only the deepest zoom uses the full resolution data.
+
+    Args:
+        xda (xarray DataArray): raster plane with numeric or datetime x and y coordinates.
+        x_axis (str): name of x dimension.
+        y_axis (str): name of y dimension.
+        reduction (str): reduction for each 2x2 block ('max', 'mean', or 'first').
+        min_size (int): reduce until x and y dimensions are no larger than this size.
+    '''
+
+    def __init__(self, xda, x_axis, y_axis, reduction='max', min_size=256):
+        self._x_axis = x_axis
+        self._y_axis = y_axis
+        self._levels = [xda]
+
+        level_xda = xda
+        while level_xda[x_axis].size > min_size or level_xda[y_axis].size > min_size:
+            level_xda = self._reduce_level(level_xda, reduction, min_size)
+            self._levels.append(level_xda)
+
+    def num_levels(self):
+        ''' Return number of levels including full resolution '''
+        return len(self._levels)
+
+    def get_view(self, x_range=None, y_range=None, screen_size=(1000, 1000)):
+        ''' Return DataArray for (min, max) x and y range (None for full range) from the coarsest level with
+            at least one point per pixel in screen_size (width, height), else full resolution. '''
+        view = None
+        for level_xda in reversed(self._levels):
+            view = self._get_range(level_xda, x_range, y_range)
+            if view[self._x_axis].size >= screen_size[0] or view[self._y_axis].size >= screen_size[1]:
+                break
+        return view
+
+    def _reduce_level(self, xda, reduction, min_size):
+        ''' Return DataArray reduced by 2 along x and y dimensions which are larger than min_size '''
+        window = {dim: 2 for dim in (self._x_axis, self._y_axis) if xda[dim].size > min_size}
+        if reduction == 'first':
+            return xda.isel({dim: slice(None, None, 2) for dim in window})
+
+        # Non-dimension coordinates (e.g. antenna names) cannot be reduced
+        coarse_xda = xda.reset_coords(drop=True).coarsen(window, boundary='pad')
+        return coarse_xda.mean() if reduction == 'mean' else coarse_xda.max()
+
+    def _get_range(self, xda, x_range, y_range):
+        ''' Return DataArray within x and y range, with one point beyond each edge to fill view '''
+        selection = {}
+        for dim, dim_range in zip((self._x_axis, self._y_axis), (x_range, y_range)):
+            if dim_range is None or None in dim_range:
+                continue
+            values = xda[dim].values
+            range_min, range_max = np.sort(np.array(dim_range).astype(values.dtype))
+            if values.size > 1 and values[0] > values[-1]:
+                # descending coordinates
+                start = values.size - np.searchsorted(values[::-1], range_max, side='right')
+                stop = values.size - np.searchsorted(values[::-1], range_min, side='left')
+            else:
+                start = np.searchsorted(values, range_min, side='left')
+                stop = np.searchsorted(values, range_max, side='right')
+            selection[dim] = slice(max(start - 1, 0), stop + 1)
+        return xda.isel(selection)
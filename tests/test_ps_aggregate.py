@@ -0,0 +1,108 @@
+'''
+Tests for chunked aggregation from partial states compared to xarray reductions.
+'''
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from vidavis.data.measurement_set.processing_set._ps_aggregate import (AGG_SKETCH_SIZE, aggregate_xda,
+    aggregate_flagged_xda, _chunk_states, _combine_states)
+
+AGGREGATORS = ['max', 'mean', 'median', 'min', 'std', 'sum', 'var']
+AGG_DIMS = ['time', 'frequency']
+
+def _make_xda(shape=(6, 5, 8), chunks=None, seed=0):
+    ''' Return (baseline, time, frequency) xda of random values with nan values and one all-nan baseline '''
+    rng = np.random.default_rng(seed)
+    values = rng.normal(10.0, 3.0, size=shape)
+    values[rng.random(shape) < 0.2] = np.nan
+    values[-1] = np.nan
+    xda = xr.DataArray(values, dims=['baseline', 'time', 'frequency'], attrs={'units': 'Jy'})
+    return xda.chunk(chunks) if chunks else xda
+
+def _reduce_xda(xda, aggregator, dims):
+    ''' Return xda reduced with xarray, nan where no values '''
+    if aggregator == 'sum':
+        return xda.sum(dim=dims, min_count=1)
+    return getattr(xda, aggregator)(dim=dims)
+
+@pytest.mark.parametrize("chunks", [None, {'time': 2, 'frequency': 3}, {'baseline': 4, 'time': 1}])
+@pytest.mark.parametrize("aggregator", AGGREGATORS)
+def test_aggregate_matches_xarray(aggregator, chunks):
+    ''' Aggregated values of chunked or unchunked xda match xarray reduction, ignoring nan '''
+    xda = _make_xda(chunks=chunks)
+    agg_xda = aggregate_xda(xda, aggregator, AGG_DIMS)
+    assert agg_xda.dims == ('baseline',)
+    assert agg_xda.attrs == xda.attrs
+    xr.testing.assert_allclose(agg_xda.compute(), _reduce_xda(xda, aggregator, AGG_DIMS).compute())
+
+def test_aggregate_one_dim():
+    ''' Aggregation along one dimension keeps the others '''
+    xda = _make_xda(chunks={'time': 2})
+    agg_xda = aggregate_xda(xda, 'mean', ['time'])
+    assert agg_xda.dims == ('baseline', 'frequency')
+    xr.testing.assert_allclose(agg_xda.compute(), xda.mean(dim='time').compute())
+
+def test_aggregate_float32():
+    ''' Float32 values are aggregated in float64 and returned as float32 '''
+    xda = _make_xda(shape=(2, 1000, 10), chunks={'time': 100}).astype(np.float32) + 1e4
+    agg_xda = aggregate_xda(xda, 'var', AGG_DIMS).compute()
+    assert agg_xda.dtype == np.float32
+    xr.testing.assert_allclose(agg_xda, xda.astype(np.float64).var(dim=AGG_DIMS).astype(np.float32), rtol=1e-5)
+
+def test_median_sketch_rank_error():
+    ''' Median of more than AGG_SKETCH_SIZE values per output value has small rank error '''
+    xda = _make_xda(shape=(3, 400, 50), chunks={'time': 50, 'frequency': 25}, seed=1)
+    assert xda.sizes['time'] * xda.sizes['frequency'] > AGG_SKETCH_SIZE
+    agg_values = aggregate_xda(xda, 'median', AGG_DIMS).values
+    for baseline in range(2):
+        values = xda.values[baseline].ravel()
+        values = np.sort(values[~np.isnan(values)])
+        rank = np.searchsorted(values, agg_values[baseline]) / values.size
+        assert abs(rank - 0.5) < 0.02
+    assert np.isnan(agg_values[-1])
+
+def test_median_state_size_small_axis():
+    ''' Median partial state of a small reduced axis is no larger than the values, and merged states are bounded '''
+    values = np.random.default_rng(5).normal(size=(100, 4))
+    values[:, 3] = np.nan
+    chunk_states = _chunk_states(values, axis=(1,), states=['sketch'])
+    state = chunk_states['values']
+    assert state['sketch_values'].shape == (100, 1, 3)
+    assert state['sketch_weights'].shape == (100, 1, 3)
+
+    merged = _combine_states([chunk_states] * 10, states=['sketch'])['values']
+    assert merged['sketch_values'].shape == (100, 1, 30)
+    merged = _combine_states([chunk_states] * 30, states=['sketch'])['values']
+    assert merged['sketch_values'].shape == (100, 1, AGG_SKETCH_SIZE)
+
+@pytest.mark.parametrize("chunks", [None, {'time': 2, 'frequency': 3}])
+@pytest.mark.parametrize("aggregator", AGGREGATORS)
+def test_aggregate_flagged(aggregator, chunks):
+    ''' Flagged aggregation uses unflagged values, or flagged values where all values are flagged '''
+    xda = _make_xda(chunks=chunks, seed=2)
+    flags = np.random.default_rng(3).random(xda.shape) < 0.3
+    flags[1] = True # all flagged
+    flags[2] = False # none flagged
+    flag_xda = xr.DataArray(flags, dims=xda.dims, attrs={'flag': True})
+    if chunks:
+        flag_xda = flag_xda.chunk(chunks)
+
+    agg_xda, agg_flag_xda = aggregate_flagged_xda(xda, flag_xda, aggregator, AGG_DIMS)
+    unflagged = _reduce_xda(xda.where(~flag_xda), aggregator, AGG_DIMS)
+    flagged = _reduce_xda(xda.where(flag_xda), aggregator, AGG_DIMS)
+    has_unflagged = (xda.notnull() & ~flag_xda).any(dim=AGG_DIMS)
+    xr.testing.assert_allclose(agg_xda.compute(), xr.where(has_unflagged, unflagged, flagged).compute())
+    assert agg_flag_xda.attrs == flag_xda.attrs
+
+    # Flag is 0 if any unflagged value, 1 if all values flagged, nan if no values
+    expected_flags = xr.where(has_unflagged, 0.0, xr.where(xda.notnull().any(dim=AGG_DIMS), 1.0, np.nan))
+    xr.testing.assert_equal(agg_flag_xda.compute(), expected_flags.compute())
+    np.testing.assert_array_equal(agg_flag_xda.values[:3], [0.0, 1.0, 0.0])
+    assert np.isnan(agg_flag_xda.values[-1])
+
+def test_invalid_aggregator():
+    ''' Invalid aggregator raises an error '''
+    with pytest.raises((ValueError, KeyError)):
+        aggregate_xda(_make_xda(), 'mode', AGG_DIMS).compute()
@@ -0,0 +1,78 @@
+'''
+Tests for single-pass ProcessingSet statistics: chunk stats and Chan et al. merge compared to numpy.
+'''
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from vidavis.data.measurement_set.processing_set._ps_stats import _combine_stats, _get_chunk_stats, _reduce_stats
+
+EMPTY_STATS = (0, 0.0, 0.0, np.nan, np.nan)
+
+def _numpy_stats(values):
+    ''' Return (count, mean, M2, min, max) of non-nan values computed with numpy '''
+    values = values[~np.isnan(values)].astype(np.float64)
+    return (values.size, values.mean(), values.var() * values.size, values.min(), values.max())
+
+def _chunk_stats_from_array(values):
+    ''' Return (count, mean, M2, min, max) of numpy values using stats of xda '''
+    return _get_chunk_stats(xr.DataArray(values))
+
+def _merge_chunks(chunks):
+    ''' Return stats merged from stats of each chunk '''
+    stats = EMPTY_STATS
+    for chunk in chunks:
+        stats = _combine_stats(stats, _chunk_stats_from_array(chunk))
+    return stats
+
+def test_chunk_stats_ignores_nan():
+    ''' Chunk stats of values with nan match numpy stats of non-nan values '''
+    rng = np.random.default_rng(1)
+    values = rng.normal(5.0, 2.0, size=(20, 30)).astype(np.float32)
+    values[rng.random(values.shape) < 0.2] = np.nan
+    np.testing.assert_allclose(_chunk_stats_from_array(values), _numpy_stats(values))
+
+def test_chunk_stats_all_nan():
+    ''' Chunk stats of all-nan values are empty '''
+    stats = _chunk_stats_from_array(np.full((4, 4), np.nan))
+    assert stats[:3] == (0, 0.0, 0.0)
+    assert np.isnan(stats[3]) and np.isnan(stats[4])
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 1000])
+def test_combine_stats_matches_numpy(chunk_size):
+    ''' Stats merged from chunks of any size match numpy stats of all values '''
+    rng = np.random.default_rng(chunk_size)
+    values = rng.lognormal(0.0, 1.5, size=1000)
+    values[rng.random(values.size) < 0.1] = np.nan
+    chunks = [values[start:start + chunk_size] for start in range(0, values.size, chunk_size)]
+    np.testing.assert_allclose(_merge_chunks(chunks), _numpy_stats(values), rtol=1e-10)
+
+def test_combine_stats_order_independent():
+    ''' Merged stats do not depend on merge order or tree shape '''
+    rng = np.random.default_rng(2)
+    chunks = [rng.normal(mean, 1.0, size=size) for mean, size in [(1e4, 50), (-3.0, 5), (0.0, 500)]]
+    stats = _merge_chunks(chunks)
+    np.testing.assert_allclose(_merge_chunks(chunks[::-1]), stats, rtol=1e-10)
+    tree_stats = _combine_stats(_chunk_stats_from_array(chunks[0]), _merge_chunks(chunks[1:]))
+    np.testing.assert_allclose(tree_stats, stats, rtol=1e-10)
+
+def test_combine_stats_large_offset():
+    ''' Variance is accurate for values with a large mean and small variance, unlike a naive sum of squares '''
+    rng = np.random.default_rng(3)
+    values = 1e8 + rng.normal(0.0, 1e-3, size=10000)
+    chunks = np.split(values, 100)
+    stats = _merge_chunks(chunks)
+    np.testing.assert_allclose(stats[2] / stats[0], values.var(), rtol=1e-6)
+
+def test_combine_stats_empty():
+    ''' Merging with empty stats returns the other stats '''
+    stats = _chunk_stats_from_array(np.arange(5.0))
+    assert _combine_stats(EMPTY_STATS, stats) == stats
+    assert _combine_stats(stats, EMPTY_STATS) == stats
+
+def test_reduce_stats_includes_zero():
+    ''' Reduced stats data range includes zero '''
+    stats = _reduce_stats([_chunk_stats_from_array(np.array([2.0, 4.0])), _chunk_stats_from_array(np.array([3.0]))], None)
+    np.testing.assert_allclose(stats, (3, 3.0, 2.0, 0.0, 4.0))
+    assert _reduce_stats([EMPTY_STATS], None)[3:] == (0.0, 0.0)
@@ -0,0 +1,78 @@
+'''
+Tests for QuantileSketch quantile estimates compared to numpy quantiles.
+'''
+
+import numpy as np
+import pytest
+
+from vidavis.data.measurement_set.processing_set._quantile_sketch import QuantileSketch
+
+FRACTIONS = (0.01, 0.1, 0.5, 0.9, 0.99)
+
+def _rank_errors(values, estimates, fractions):
+    ''' Return normalized rank errors of estimated quantile values in values '''
+    sorted_values = np.sort(values)
+    low_ranks = np.searchsorted(sorted_values, estimates, side='left') / values.size
+    high_ranks = np.searchsorted(sorted_values, estimates, side='right') / values.size
+    fractions = np.asarray(fractions)
+    # estimate is within rank error if any of its ranks is
+    return np.maximum(0.0, np.maximum(low_ranks - fractions, fractions - high_ranks))
+
+def test_exact_without_compaction():
+    ''' Quantiles are exact (inverted cdf) when values fit in capacity '''
+    values = np.random.default_rng(1).normal(size=500)
+    sketch = QuantileSketch(capacity=1024, seed=1)
+    sketch.update(values)
+    assert sketch.count() == values.size
+    assert sketch.rank_error() == 0.0
+    np.testing.assert_array_equal(sketch.quantiles(FRACTIONS), np.quantile(values, FRACTIONS, method='inverted_cdf'))
+
+def test_ignores_nan():
+    ''' Nan values are not counted or used in quantiles '''
+    values = np.arange(100.0)
+    sketch = QuantileSketch(seed=1)
+    sketch.update(np.concatenate((values, np.full(50, np.nan))))
+    assert sketch.count() == values.size
+    np.testing.assert_array_equal(sketch.quantiles(FRACTIONS), np.quantile(values, FRACTIONS, method='inverted_cdf'))
+
+def test_empty():
+    ''' Empty sketch returns nan quantiles '''
+    sketch = QuantileSketch()
+    sketch.update(np.full(10, np.nan))
+    assert sketch.count() == 0
+    assert np.isnan(sketch.quantiles(FRACTIONS)).all()
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rank_error_bound(seed):
+    ''' Rank errors of compacted sketch are within its rank error bound '''
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(0.0, 2.0, size=200000)
+    sketch = QuantileSketch(capacity=256, seed=seed)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+    assert sketch.count() == values.size
+    assert 0.0 < sketch.rank_error() < 0.05
+    assert (_rank_errors(values, sketch.quantiles(FRACTIONS), FRACTIONS) <= sketch.rank_error()).all()
+
+def test_merge():
+    ''' Sketch merged from sketches of chunks estimates quantiles of all values '''
+    rng = np.random.default_rng(2)
+    chunks = [rng.normal(mean, 1.0, size=20000) for mean in (-5.0, 0.0, 10.0)]
+    values = np.concatenate(chunks)
+    sketch = QuantileSketch(capacity=256, seed=2)
+    for chunk in chunks:
+        chunk_sketch = QuantileSketch(capacity=256, seed=3)
+        chunk_sketch.update(chunk)
+        sketch.merge(chunk_sketch)
+    assert sketch.count() == values.size
+    assert (_rank_errors(values, sketch.quantiles(FRACTIONS), FRACTIONS) <= sketch.rank_error()).all()
+
+def test_seed_reproducible():
+    ''' Sketches with the same seed and values have the same quantiles '''
+    values = np.random.default_rng(4).random(100000)
+    estimates = []
+    for _ in range(2):
+        sketch = QuantileSketch(capacity=128, seed=5)
+        sketch.update(values)
+        estimates.append(sketch.quantiles(FRACTIONS))
+    np.testing.assert_array_equal(estimates[0], estimates[1])